@@ -2,6 +2,7 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
 from app.utils.chat_glm import start_model
+from app.utils.components import components
 
 apps = Flask(__name__)# 这段代码是为了解决跨域问题，Flask默认不支持跨域
 CORS(apps, resources=r'/*')# CORS的用法是（Cross-Origin Resource Sharing，跨域资源共享
@@ -16,6 +17,13 @@ def route_index():
     return jsonify({"message": "You Got It!"})
 
 
+@apps.route('/ready', methods=["GET"])
+def route_ready():
+    # 所有组件加载完成时返回 200，否则返回 503，并给出各组件的状态
+    ready = components.is_ready()
+    return jsonify({"ready": ready, "components": components.status()}), 200 if ready else 503
+
+
 @apps.errorhandler(404)
 def page_not_found(e):
     return jsonify({"message": "DEBUG: " + str(e)}), 404
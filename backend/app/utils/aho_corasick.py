@@ -0,0 +1,92 @@
+from collections import deque
+
+
+class AhoCorasick:
+    '''多模式串匹配自动机
+
+    先 add() 所有模式串，再 build() 构建失败指针，之后 iter() 一次线性扫描即可找出文本中出现的全部模式串。
+
+    Example:
+        ac = AhoCorasick()
+        ac.add("舰艇", 0)
+        ac.add("舰艇损管", 1)
+        ac.build()
+        list(ac.iter("舰艇损管条例"))  # [(0, 2, 0), (0, 4, 1)]
+    '''
+
+    def __init__(self):
+        self._goto = [{}]    # 状态转移表
+        self._fail = [0]     # 失败指针
+        self._out = [[]]     # 每个状态命中的 (模式长度, value)
+        self._built = False
+
+    def add(self, pattern, value=None):
+        '''添加一个模式串，value 为命中时返回的值（默认为模式串本身）'''
+        if not pattern:
+            return
+
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+
+        self._out[state].append((len(pattern), pattern if value is None else value))
+        self._built = False
+
+    def build(self):
+        '''按 BFS 顺序计算失败指针，并把失败链上的输出合并到当前状态'''
+        queue = deque()
+        for nxt in self._goto[0].values():
+            self._fail[nxt] = 0
+            queue.append(nxt)
+
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = fail if fail != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+        self._built = True
+        return self
+
+    def iter(self, text):
+        '''扫描 text，依次产出 (start, end, value)，end 为开区间'''
+        if not self._built:
+            self.build()
+
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, value in out[state]:
+                yield i + 1 - length, i + 1, value
+
+    def longest_matches(self, text, min_length=1):
+        '''最长优先的不重叠匹配：所有命中按长度从长到短依次选取，与已选区间重叠的跳过，结果按出现位置排序'''
+        matches = [m for m in self.iter(text) if m[1] - m[0] >= min_length]
+        matches.sort(key=lambda m: (m[0] - m[1], m[0]))
+
+        taken = [False] * len(text)
+        selected = []
+        for start, end, value in matches:
+            if any(taken[start:end]):
+                continue
+            taken[start:end] = [True] * (end - start)
+            selected.append((start, end, value))
+
+        selected.sort()
+        return selected
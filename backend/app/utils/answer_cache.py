@@ -0,0 +1,136 @@
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_question(text):
+    '''问题的规范化形式：统一小写，去掉空白、标点和控制字符'''
+    return "".join(ch for ch in text.lower() if unicodedata.category(ch)[0] not in "PZC")
+
+
+def embed(text, dim):
+    '''字符 unigram + bigram 哈希到 dim 维并做 L2 归一化，余弦相似度即为点积'''
+    vec = np.zeros(dim, dtype=np.float32)
+    grams = list(text) + [text[i:i + 2] for i in range(len(text) - 1)]
+    for gram in grams:
+        vec[zlib.crc32(gram.encode('utf-8')) % dim] += 1.0
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+def context_fingerprint(*parts):
+    '''检索到的参考资料（三元组、Wikipedia 摘要等）的指纹'''
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class AnswerCache:
+    '''回答缓存
+
+    键为 规范化问题 + 参考资料指纹，参考资料相同、问题相同的请求直接复用之前生成的回答。
+    similarity > 0 时，精确查找未命中再在参考资料相同的条目中按问题向量（NumPy 矩阵）找余弦相似度最高的一条，
+    不低于 similarity 即视为命中。条目按 LRU 淘汰并有 TTL；图谱版本变化时整个缓存失效。
+    '''
+
+    def __init__(self, maxsize=512, ttl=3600, similarity=0.0, dim=1024):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.similarity = similarity
+        self.dim = dim
+        self.version = None
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        # 每个条目占用向量矩阵中的一行，_fingerprints 保存该行参考资料指纹的前 60 位，用于筛选候选
+        self._entries = OrderedDict()  # (question, fingerprint) -> (response, expires, row)
+        self._vectors = np.zeros((max(maxsize, 0), dim), dtype=np.float32)
+        self._fingerprints = np.full(max(maxsize, 0), -1, dtype=np.int64)
+        self._keys = [None] * max(maxsize, 0)
+        self._free = list(range(max(maxsize, 0)))
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _fingerprint_id(fingerprint):
+        return int(fingerprint[:15], 16)
+
+    def _sync_version(self, version):
+        if version != self.version:
+            self._entries.clear()
+            self._fingerprints[:] = -1
+            self._keys = [None] * self.maxsize
+            self._free = list(range(self.maxsize))
+            self.version = version
+
+    def _remove(self, key):
+        _, _, row = self._entries.pop(key)
+        self._fingerprints[row] = -1
+        self._keys[row] = None
+        self._free.append(row)
+
+    def _nearest(self, question, fingerprint):
+        rows = np.flatnonzero(self._fingerprints == self._fingerprint_id(fingerprint))
+        if not len(rows):
+            return None
+        sims = self._vectors[rows] @ embed(question, self.dim)
+        best = int(np.argmax(sims))
+        if sims[best] < self.similarity:
+            return None
+        return self._keys[rows[best]]
+
+    def get(self, question, fingerprint, version):
+        '''返回缓存的回答，未命中返回 None'''
+        if self.maxsize <= 0:
+            return None
+
+        question = normalize_question(question)
+        with self._lock:
+            self._sync_version(version)
+
+            key = (question, fingerprint)
+            semantic = False
+            if key not in self._entries and self.similarity > 0:
+                key = self._nearest(question, fingerprint)
+                semantic = True
+
+            entry = self._entries.get(key) if key is not None else None
+            if entry is not None and entry[1] <= time.time():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.semantic_hits += semantic
+            return entry[0]
+
+    def put(self, question, fingerprint, version, response):
+        if self.maxsize <= 0:
+            return
+
+        question = normalize_question(question)
+        with self._lock:
+            self._sync_version(version)
+
+            key = (question, fingerprint)
+            if key in self._entries:
+                self._remove(key)
+            while len(self._entries) >= self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+            row = self._free.pop()
+            self._vectors[row] = embed(question, self.dim)
+            self._fingerprints[row] = self._fingerprint_id(fingerprint)
+            self._keys[row] = key
+            self._entries[key] = (response, time.time() + self.ttl, row)
+
+    def stats(self):
+        return {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits,
+                'semantic_hits': self.semantic_hits, 'misses': self.misses}
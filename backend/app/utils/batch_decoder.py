@@ -0,0 +1,229 @@
+import copy
+import inspect
+
+import torch
+from transformers import LogitsProcessorList
+from transformers.modeling_outputs import CausalLMOutputWithPast
+
+from app.utils.scheduler import BatchDecoder
+
+# 启动时用于校验批量解码与 stream_chat 输出一致的问题，长度不同，用来识别 KV 缓存的序列维
+PROBES = [
+    ("你好", []),
+    ("舰艇损管的基本原则是什么", [("你好", "你好👋！我是人工智能助手 ChatGLM-6B，很高兴见到你，欢迎问我任何问题。")]),
+]
+
+
+def _last(stream):
+    item = None
+    for item in stream:
+        pass
+    return item
+
+
+def _leaf(past):
+    '''past_key_values 中的第一个张量'''
+    while not isinstance(past, torch.Tensor):
+        past = past[0]
+    return past
+
+
+def _merge(pasts, fn):
+    '''按 past_key_values 的嵌套结构（每层 (key, value)）逐个张量合并：fn 接收各序列对应位置的张量列表'''
+    first = pasts[0]
+    if isinstance(first, torch.Tensor):
+        return fn(pasts)
+    return type(first)(_merge([past[i] for past in pasts], fn) for i in range(len(first)))
+
+
+class _State:
+    '''一个序列的解码状态：完整的 input_ids 和模型自己维护的 model_kwargs（past_key_values、attention_mask、position_ids）'''
+
+    def __init__(self, query, history, input_ids, model_kwargs, max_length, logits_processor, logits_warper):
+        self.query = query
+        self.history = history
+        self.input_ids = input_ids
+        self.prompt_length = input_ids.shape[-1]
+        self.model_kwargs = model_kwargs
+        self.max_length = max_length
+        self.logits_processor = logits_processor
+        self.logits_warper = logits_warper
+
+
+class HFBatchDecoder(BatchDecoder):
+    '''ChatGLM（及其他 transformers 因果语言模型）的批量解码器，产出与 model.stream_chat 相同的 (response, history)
+
+    每个序列单独 prefill 并保存自己的 KV 缓存；每个解码步先用模型自己的 prepare_inputs_for_generation
+    为每个序列准备单步输入，再把 KV 缓存和注意力掩码左填充到相同长度后拼成一个批次，只做一次前向，
+    最后把输出的 KV 按序列拆开、去掉填充，交给模型自己的 _update_model_kwargs_for_generation。
+    填充位置在掩码中被屏蔽：bool 掩码按 ChatGLM 的约定（True 为屏蔽）填 True，整数掩码（1 为可见）填 0。
+
+    采样参数与 stream_chat 的默认值一致。不同模型的提示格式、KV 布局和掩码约定并不统一，
+    因此启动时用 build() 以贪心解码比较批量结果和 stream_chat，不一致或出错时返回 None，调度器回退为逐个生成。
+    '''
+
+    def __init__(self, model, tokenizer, seq_dim=None, batch_dim=None, max_length=2048, max_new_tokens=None,
+                 do_sample=True, top_p=0.7, temperature=0.95):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.seq_dim = seq_dim
+        self.batch_dim = batch_dim
+        self.max_length = max_length
+        self.max_new_tokens = max_new_tokens
+        self.do_sample = do_sample
+        self.top_p = top_p
+        self.temperature = temperature
+
+        eos_token_id = model.generation_config.eos_token_id
+        self.eos_token_ids = set(eos_token_id if isinstance(eos_token_id, (list, tuple)) else [eos_token_id])
+        # stream_chat 额外使用的 InvalidScoreLogitsProcessor 定义在模型代码（trust_remote_code）中
+        self.invalid_score_processor = getattr(inspect.getmodule(type(model)), 'InvalidScoreLogitsProcessor', None)
+
+    @classmethod
+    def build(cls, model, tokenizer):
+        '''校验通过时返回批量解码器，否则返回 None'''
+        try:
+            probe = cls(model, tokenizer, do_sample=False, max_new_tokens=8)
+            if not probe.verify():
+                print("批量解码与 stream_chat 的输出不一致，生成回退为逐个序列轮流推进")
+                return None
+        except Exception as e:
+            print(f"模型不支持批量解码，生成回退为逐个序列轮流推进: {e}")
+            return None
+
+        print("已启用批量解码")
+        return cls(model, tokenizer, probe.seq_dim, probe.batch_dim)
+
+    def verify(self):
+        '''所有探测问题放在同一个批次中贪心解码，结果须与逐个调用 stream_chat 完全一致'''
+        outputs, states = {}, {}
+        for i, (query, history) in enumerate(PROBES):
+            state, outputs[i], finished = self.start(query, history)
+            if not finished:
+                states[i] = state
+        self._detect_dims([state.model_kwargs["past_key_values"] for state in states.values()])
+
+        while states:
+            keys = list(states)
+            for key, (output, finished) in zip(keys, self.step([states[key] for key in keys])):
+                outputs[key] = output
+                if finished:
+                    del states[key]
+
+        for i, (query, history) in enumerate(PROBES):
+            expected = _last(self.model.stream_chat(self.tokenizer, query, history, do_sample=False,
+                                                    max_new_tokens=self.max_new_tokens))[0]
+            if outputs[i][0] != expected:
+                return False
+        return True
+
+    def _detect_dims(self, pasts):
+        '''两个长度不同的探测问题 prefill 后，KV 张量中大小不同的维是序列维，其余大小为 1 的维是批次维'''
+        if len(pasts) < 2:
+            raise ValueError("探测问题提前结束，无法识别 KV 缓存布局")
+        a, b = _leaf(pasts[0]).shape, _leaf(pasts[1]).shape
+        self.seq_dim = next(dim for dim in range(len(a)) if a[dim] != b[dim])
+        self.batch_dim = next(dim for dim in range(len(a)) if dim != self.seq_dim and a[dim] == 1)
+
+    def build_prompt(self, query, history):
+        '''与 stream_chat 相同的多轮对话提示'''
+        if hasattr(self.tokenizer, 'build_prompt'):
+            return self.tokenizer.build_prompt(query, history)
+        if not history:
+            return query
+        prompt = ""
+        for i, (old_query, response) in enumerate(history):
+            prompt += "[Round {}]\n问：{}\n答：{}\n".format(i, old_query, response)
+        prompt += "[Round {}]\n问：{}\n答：".format(len(history), query)
+        return prompt
+
+    def start(self, query, history):
+        inputs = self.tokenizer([self.build_prompt(query, history)], return_tensors="pt").to(self.model.device)
+        input_ids = inputs["input_ids"]
+        model_kwargs = {key: value for key, value in inputs.items() if key != "input_ids"}
+        model_kwargs["use_cache"] = True
+
+        # 与 stream_generate 相同的 logits 处理
+        generation_config = copy.deepcopy(self.model.generation_config)
+        generation_config.update(max_length=self.max_length, do_sample=self.do_sample, top_p=self.top_p,
+                                 temperature=self.temperature)
+        processors = LogitsProcessorList()
+        if self.invalid_score_processor is not None:
+            processors.append(self.invalid_score_processor())
+        logits_processor = self.model._get_logits_processor(
+            generation_config=generation_config, input_ids_seq_length=input_ids.shape[-1], encoder_input_ids=input_ids,
+            prefix_allowed_tokens_fn=None, logits_processor=processors)
+        logits_warper = self.model._get_logits_warper(generation_config)
+
+        max_length = self.max_length
+        if self.max_new_tokens is not None:
+            max_length = input_ids.shape[-1] + self.max_new_tokens
+        state = _State(query, history, input_ids, model_kwargs, max_length, logits_processor, logits_warper)
+
+        model_inputs = self.model.prepare_inputs_for_generation(input_ids, **model_kwargs)
+        with torch.no_grad():
+            outputs = self.model(**model_inputs, return_dict=True)
+        output, finished = self._advance(state, outputs.logits[:, -1, :], outputs.past_key_values)
+        return state, output, finished
+
+    def step(self, states):
+        inputs = [self.model.prepare_inputs_for_generation(state.input_ids, **state.model_kwargs) for state in states]
+        lengths = [_leaf(item["past_key_values"]).shape[self.seq_dim] for item in inputs]
+        pads = [max(lengths) - length for length in lengths]
+
+        batch = dict(inputs[0])
+        batch["input_ids"] = torch.cat([item["input_ids"] for item in inputs], dim=0)
+        batch["past_key_values"] = _merge([item["past_key_values"] for item in inputs], lambda tensors: torch.cat(
+            [self._pad_kv(tensor, pad) for tensor, pad in zip(tensors, pads)], dim=self.batch_dim))
+        if batch.get("position_ids") is not None:
+            batch["position_ids"] = torch.cat([item["position_ids"] for item in inputs], dim=0)
+        if batch.get("attention_mask") is not None:
+            batch["attention_mask"] = torch.cat(
+                [self._pad_mask(item["attention_mask"], pad) for item, pad in zip(inputs, pads)], dim=0)
+
+        with torch.no_grad():
+            outputs = self.model(**batch, return_dict=True)
+
+        results = []
+        for i, (state, pad) in enumerate(zip(states, pads)):
+            def split(tensor, i=i, pad=pad):
+                tensor = tensor.narrow(self.batch_dim, i, 1)
+                return tensor.narrow(self.seq_dim, pad, tensor.shape[self.seq_dim] - pad)
+
+            past = _merge([outputs.past_key_values], lambda tensors: split(tensors[0]))
+            results.append(self._advance(state, outputs.logits[i:i + 1, -1, :], past))
+        return results
+
+    def _pad_kv(self, tensor, pad):
+        if pad == 0:
+            return tensor
+        shape = list(tensor.shape)
+        shape[self.seq_dim] = pad
+        return torch.cat([tensor.new_zeros(shape), tensor], dim=self.seq_dim)
+
+    @staticmethod
+    def _pad_mask(mask, pad):
+        if pad == 0:
+            return mask
+        fill = mask.new_ones if mask.dtype == torch.bool else mask.new_zeros
+        return torch.cat([fill((*mask.shape[:-1], pad)), mask], dim=-1)
+
+    def _advance(self, state, logits, past_key_values):
+        '''按 stream_generate 的方式选出下一个 token，更新序列状态，返回 ((response, history), finished)'''
+        scores = state.logits_processor(state.input_ids, logits)
+        scores = state.logits_warper(state.input_ids, scores)
+        probs = torch.nn.functional.softmax(scores, dim=-1)
+        if self.do_sample:
+            next_token = torch.multinomial(probs, num_samples=1).squeeze(1)
+        else:
+            next_token = torch.argmax(probs, dim=-1)
+
+        state.input_ids = torch.cat([state.input_ids, next_token[:, None]], dim=-1)
+        state.model_kwargs = self.model._update_model_kwargs_for_generation(
+            CausalLMOutputWithPast(past_key_values=past_key_values), state.model_kwargs, is_encoder_decoder=False)
+
+        response = self.tokenizer.decode(state.input_ids[0, state.prompt_length:].tolist())
+        if hasattr(self.model, 'process_response'):
+            response = self.model.process_response(response)
+        finished = int(next_token[0]) in self.eos_token_ids or state.input_ids.shape[-1] >= state.max_length
+        return (response, state.history + [(state.query, response)]), finished
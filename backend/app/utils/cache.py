@@ -0,0 +1,204 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class LRUCache:
+    '''线程安全的 LRU 缓存，超过 maxsize 条时淘汰最久未使用的条目，并统计命中 / 未命中次数'''
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+class SqliteStore:
+    '''基于 SQLite 的持久化键值存储，值以 JSON 保存
+
+    超过 max_rows 条时按最近访问时间淘汰最旧的条目，进程重启后缓存仍然有效。
+    命中时不立即写盘：访问时间比 touch_interval 秒更旧的条目先记在内存中，
+    下一次 put()（本来就要写盘）或积累到 touch_batch 条时再一次性更新，淘汰只需要粗粒度的访问时间。
+    '''
+
+    def __init__(self, path, max_rows=100000, touch_interval=3600, touch_batch=256):
+        self.path = str(path)
+        self.max_rows = max_rows
+        self.touch_interval = touch_interval
+        self.touch_batch = touch_batch
+        self._touched = {}  # key -> 尚未写入的访问时间
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, atime REAL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS kv_atime ON kv (atime)')
+        self._conn.commit()
+        self._size = self._conn.execute('SELECT COUNT(*) FROM kv').fetchone()[0]
+
+    def __len__(self):
+        return self._size
+
+    def get(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute('SELECT value, atime FROM kv WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            now = time.time()
+            if now - row[1] >= self.touch_interval:
+                self._touched[key] = now
+                if len(self._touched) >= self.touch_batch:
+                    self._flush_touched()
+                    self._conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def _flush_touched(self):
+        '''把攒下的访问时间写入数据库（调用方持有锁并负责 commit）'''
+        if self._touched:
+            self._conn.executemany('UPDATE kv SET atime = ? WHERE key = ?',
+                                   [(atime, key) for key, atime in self._touched.items()])
+            self._touched.clear()
+
+    def put(self, key, value):
+        with self._lock:
+            # 先写入攒下的访问时间，淘汰时按最新的访问时间排序
+            self._flush_touched()
+            exists = self._conn.execute('SELECT 1 FROM kv WHERE key = ?', (key,)).fetchone() is not None
+            self._conn.execute('INSERT OR REPLACE INTO kv (key, value, atime) VALUES (?, ?, ?)',
+                               (key, json.dumps(value, ensure_ascii=False), time.time()))
+            if not exists:
+                self._size += 1
+            if self._size > self.max_rows:
+                self._conn.execute('DELETE FROM kv WHERE key IN (SELECT key FROM kv ORDER BY atime LIMIT ?)',
+                                   (self._size - self.max_rows,))
+                self._size = self.max_rows
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._touched.pop(key, None)
+            cursor = self._conn.execute('DELETE FROM kv WHERE key = ?', (key,))
+            self._size -= cursor.rowcount
+            self._conn.commit()
+
+    def stats(self):
+        return {'size': self._size, 'max_rows': self.max_rows, 'hits': self.hits, 'misses': self.misses}
+
+
+class TTLCache:
+    '''带过期时间的缓存，命中结果和未命中结果（值为 None）分别使用 ttl / negative_ttl
+
+    内存中是一个 LRUCache，可选用 SqliteStore 做持久化（重启后仍然有效）。
+    get_or_load() 对同一个 key 的并发加载只执行一次 loader，其余线程等待并共享结果；
+    loader 抛出的异常会传给所有等待者，但不会被缓存。
+    '''
+
+    def __init__(self, maxsize=1024, ttl=86400, negative_ttl=3600, store=None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory = LRUCache(maxsize)
+        self.store = store
+        self.loads = 0
+        self.shared = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        '''返回 (是否命中, 值)：值为 None 的命中表示缓存了"不存在"'''
+        entry = self.memory.get(key)
+        if entry is None and self.store is not None:
+            entry = self.store.get(key)
+            if entry is not None:
+                entry = tuple(entry)
+                self.memory.put(key, entry)
+
+        if entry is not None and entry[1] > time.time():
+            return True, entry[0]
+        return False, default
+
+    def put(self, key, value):
+        expires = time.time() + (self.ttl if value is not None else self.negative_ttl)
+        self.memory.put(key, (value, expires))
+        if self.store is not None:
+            self.store.put(key, [value, expires])
+
+    def get_or_load(self, key, loader):
+        found, value = self.get(key)
+        if found:
+            return value
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            else:
+                self.shared += 1
+        if not owner:
+            return future.result()
+
+        try:
+            # 等锁期间可能已有其他线程加载完成
+            found, value = self.get(key)
+            if not found:
+                self.loads += 1
+                value = loader(key)
+                self.put(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self):
+        return {
+            'memory': self.memory.stats(),
+            'disk': self.store.stats() if self.store is not None else None,
+            'loads': self.loads,
+            'shared': self.shared,
+        }
@@ -6,21 +6,42 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspa
 
 import json
 from opencc import OpenCC
-from transformers import AutoTokenizer, AutoModel
+from app.utils.answer_cache import AnswerCache, context_fingerprint
+from app.utils.components import components
 from app.utils.image_searcher import ImageSearcher
-from app.utils.query_wiki import WikiSearcher
-from app.utils.ner import Ner
-from app.utils.graph_utils import convert_graph_to_triples, search_node_item
+from app.utils.prefix_cache import PrefixCache
+from app.utils.prompt_builder import PromptBuilder
+from app.utils.retrieval import RetrievalStage
+from app.utils.scheduler import GenerationScheduler
+from app.utils.graph_store import graph_store
+from app.utils.graph_utils import SubgraphBuilder, rank_triples, search_node_item
 from config.settings import settings
 
 model = None
 tokenizer = None
 init_history = None
+prefix_cache = None
 
-ner = Ner()
-image_searcher = ImageSearcher()
-wiki_searcher = WikiSearcher()
-cc = OpenCC('t2s')
+answer_cache = AnswerCache(settings.ANSWER_CACHE_SIZE, settings.ANSWER_CACHE_TTL, settings.ANSWER_CACHE_SIMILARITY)
+
+
+def _load_ner():
+    from app.utils.ner import Ner
+    return Ner()
+
+
+def _load_wiki_searcher():
+    if settings.WIKI_MODE == "offline":
+        from app.utils.wiki_store import WikiStore
+        return WikiStore(settings.WIKI_STORE_PATH)
+    from app.utils.query_wiki import WikiSearcher
+    return WikiSearcher()
+
+
+def _t2s(text):
+    """繁体转简体；OpenCC 尚未加载时原样返回"""
+    cc = components.get("opencc")
+    return cc.convert(text) if cc is not None else text
 
 def predict(user_input, history=None):
     global model, tokenizer, init_history
@@ -29,53 +50,140 @@ def predict(user_input, history=None):
     return model.chat(tokenizer, user_input, history)
 
 
-def stream_predict(user_input, history=None):
-    global model, tokenizer, init_history
-    if not history:
-        history = init_history
+def _graph_context(user_input, entities, snapshot):
+    """在图谱快照 snapshot 中检索实体的子图，并选出得分最高的三元组"""
+    graph = {}
+    builder = SubgraphBuilder(snapshot)
+    for entity in entities:
+        graph = search_node_item(entity, builder)
+
+    # 对子图中的三元组打分，取得分最高的若干条作为候选，最终放入 prompt 的条数由 token 预算决定
+    MAX_TRIPLES = 20  # 可根据需要调整
+    triples = rank_triples(builder.graph, builder.edge_ids, user_input, entities, k=MAX_TRIPLES)
+    return graph, triples
+
 
-    ref = ""
+def retrieve(user_input):
+    """并发执行各个检索源，每个检索源有独立的截止时间，超时的结果直接丢弃
+
+    实体优先用图谱节点名称词典识别，词典没有命中足够具体的名称时再调用 NER 模型并合并结果；图片检索不依赖实体，最先开始；
+    图谱和 Wikipedia 检索在拿到实体后并发执行，各个实体和原始问题（最多 RETRIEVAL_WIKI_MAX_CANDIDATES 个）同时查询 Wikipedia，按优先级取第一个存在的词条。
+    尚未加载完成的组件对应的检索源直接跳过。
+    图谱快照在开头取一次（图谱文件有变化时 refresh() 加载新版本），实体识别、子图检索和回答缓存都使用同一个快照，
+    一个请求不会混用两个版本的图谱。
+    Returns:
+        entities, graph, triples, image, wiki, snapshot（图谱未就绪时为 None）
+    """
+    stage = RetrievalStage()
+    image_searcher = components.get("image_searcher")
+    if image_searcher is not None:
+        stage.submit("image", settings.RETRIEVAL_IMAGE_TIMEOUT, image_searcher.search, user_input)
+
+    snapshot = graph_store.refresh() if components.is_ready("graph") else None
 
     # 获取实体
-    graph = {}
-    entities = []
-    entities = ner.get_entities(user_input, etypes=["物体类", "人物类", "地点类", "组织机构类", "事件类", "世界地区类", "术语类"])
+    entities, specific = [], False
+    if settings.GAZETTEER_ENABLED and snapshot is not None:
+        gazetteer = snapshot.gazetteer
+        entities = gazetteer.link(user_input)
+        specific = gazetteer.is_specific(entities)
+    ner = components.get("ner")
+    if not specific and ner is not None:
+        stage.submit("ner", settings.RETRIEVAL_NER_TIMEOUT, ner.get_entities, user_input,
+                     etypes=["物体类", "人物类", "地点类", "组织机构类", "事件类", "世界地区类", "术语类"])
+        entities = list(dict.fromkeys(entities + stage.result("ner", [])))
     print("entities: ", entities)
 
-    # 获取实体的三元组
-    triples = []
-    for entity in entities:
-        graph = search_node_item(entity, graph if graph else None)
+    if snapshot is not None:
+        stage.submit("graph", settings.RETRIEVAL_GRAPH_TIMEOUT, _graph_context, user_input, entities, snapshot)
+    wiki_searcher = components.get("wiki_searcher")
+    if wiki_searcher is not None:
+        stage.submit_first_hit("wiki", settings.RETRIEVAL_WIKI_TIMEOUT, wiki_searcher.search, entities + [user_input],
+                               limit=settings.RETRIEVAL_WIKI_MAX_CANDIDATES)
+
+    graph, triples = stage.result("graph", ({}, []))
+    image = stage.result("image")
+    wiki = stage.result("wiki")
+    return entities, graph, triples, image, wiki, snapshot
+
+
+def _remember(steps, user_input, fingerprint, version):
+    """原样转发生成结果，完整生成结束后把回答写入回答缓存（客户端中途断开时不写入）"""
+    updates = {}
+    for history, updates in steps:
+        yield history, updates
+    if updates.get("response"):
+        answer_cache.put(user_input, fingerprint, version, updates["response"])
+
+
+def _frame(obj):
+    return json.dumps(obj, ensure_ascii=False).encode('utf8') + b'\n'
+
+
+def _open_stream(chat_input, history):
+    """在生成线程中调用，返回模型的流式生成器"""
+    if prefix_cache is not None:
+        return prefix_cache.stream_chat(model, tokenizer, chat_input, history)
+    return model.stream_chat(tokenizer, chat_input, history)
+
 
-        if graph:
-            triples += convert_graph_to_triples(graph, entity)
+# 所有请求的生成都经过同一个调度器，由单独的生成线程执行：模型加载后通过校验时设置 scheduler.decoder，
+# 每个解码步对所有活跃请求做一次批量前向；否则回退为 _open_stream 逐个序列轮流推进
+scheduler = GenerationScheduler(_open_stream, settings.GENERATION_MAX_ACTIVE, settings.GENERATION_MAX_QUEUE)
 
-    # 控制三元组数量，避免 prompt 过长
-    MAX_TRIPLES = 10  # 可根据需要调整，如 10～20
-    if len(triples) > MAX_TRIPLES:
-        triples = triples[:MAX_TRIPLES]
 
-    triples_str = ""
-    for t in triples:
-        triples_str += f"({t[0]} {t[1]} {t[2]})；"
+def _updates(stream):
+    for response, history in stream:
+        updates = {}
+        for query, response in history:
+            updates["query"] = query
+            updates["response"] = response
+        yield history, updates
 
-    if triples_str:
-        ref += f"三元组信息：{triples_str}；"
 
+def _generate(chat_input, history):
+    """提交生成请求，返回 (stream, steps)：stream 为调度器的结果迭代器（用于取消），steps 逐步产出 (history, updates)；
+    模型未加载时 stream 为 None，steps 只产出一条提示
 
-    image = image_searcher.search(user_input)
+    排队已满时立即抛出 QueueFull。
+    """
+    if model is None:
+        return None, iter([(history, {"query": chat_input, "response": "模型加载中，请稍后再试"})])
+    stream = scheduler.submit(chat_input, history)
+    return stream, _updates(stream)
 
-    for ent in entities + [user_input]:
-        wiki = wiki_searcher.search(ent)
-        if wiki is not None:
-            break
 
-    # 将Wikipedia搜索到的繁体转为简体，并控制摘要长度，避免输入过长
+def stream_predict(user_input, history=None, protocol=1):
+    """流式回答
+
+    protocol=1（默认）：每生成一步都返回一行完整的 JSON（history、updates、image、graph、wiki）。
+    protocol=2：增量协议，每行一个帧：
+        {"type": "start", "image", "graph", "wiki", "references"}  检索结果，只发送一次
+        {"type": "delta", "offset", "text"}  回答从 offset 处截断后追加 text（通常 offset 为已收到的长度）
+        {"type": "end", "updates", "history"}  完整的回答和新的对话历史
+    """
+    global model, tokenizer, init_history
+    if not history:
+        history = init_history
+
+    entities, graph, triples, image, wiki, snapshot = retrieve(user_input)
+
+    # 三元组、Wikipedia 摘要和对话历史按 token 预算裁剪，每轮输入长度有上限
+    clean_history = []
+    for query, response in history or []:
+        if "===参考资料===" in query:
+            query = query.split("===参考资料===")[0]
+        clean_history.append((query, response))
+
+    builder = PromptBuilder(tokenizer)
+    summary = _t2s(wiki.summary) if wiki else ""
+    chat_input, clean_history, triples, summary = builder.build(
+        user_input, triples, summary, clean_history, pinned=init_history or ())
+
+    # 将Wikipedia搜索到的繁体转为简体
     if wiki:
-        summary = cc.convert(wiki.summary)[:500]  # 只保留前 500 个字符，可按需调整
-        ref += summary
         wiki = {
-            "title": cc.convert(wiki.title),
+            "title": _t2s(wiki.title),
             "summary": summary,
         }
         print(wiki)
@@ -86,51 +194,70 @@ def stream_predict(user_input, history=None):
         }
 
     if model is not None:
-        if ref:
-            chat_input = f"\n===参考资料===：\n{ref}；\n\n根据上面资料，用简洁且准确的话回答下面问题：\n{user_input}"
-        else:
-            chat_input = user_input
-
-        clean_history = []
-        for user_input, response in history:
-            if "===参考资料===" in user_input:
-                user_input = user_input.split("===参考资料===")[0]
-            clean_history.append((user_input, response))
-
         print("chat_input: ", chat_input)
-        for response, history in model.stream_chat(tokenizer, chat_input, clean_history):
-            updates = {}
-            for query, response in history:
-                updates["query"] = query
-                updates["response"] = response
-
-            result = {
-                "history": history,
-                "updates": updates,
-                "image": image,
-                "graph": graph,
-                "wiki": wiki
-            }
-            yield json.dumps(result, ensure_ascii=False).encode('utf8') + b'\n'
+    else:
+        chat_input, clean_history = user_input, history
+
+    # 对话第一轮的回答只取决于问题和参考资料，命中回答缓存时直接重放，不再生成
+    cacheable = (model is not None and snapshot is not None
+                 and [tuple(turn) for turn in clean_history] == [tuple(turn) for turn in init_history or []])
+    cached = None
+    if cacheable:
+        fingerprint = context_fingerprint(triples, summary)
+        version = snapshot.version
+        cached = answer_cache.get(user_input, fingerprint, version)
 
+    stream = None
+    if cached is not None:
+        steps = iter([(list(clean_history) + [(chat_input, cached)], {"query": chat_input, "response": cached})])
     else:
-        updates = {
-            "query": user_input,
-            "response": "模型加载中，请稍后再试"
-        }
+        stream, steps = _generate(chat_input, clean_history)
+        if cacheable:
+            steps = _remember(steps, user_input, fingerprint, version)
 
-        result = {
-            "history": history,
-            "updates": updates,
+    # 客户端断开时 Flask 关闭本生成器，即使还没开始读取生成结果（增量协议先发送检索结果帧），也要取消生成
+    try:
+        if protocol != 2:
+            for history, updates in steps:
+                yield _frame({
+                    "history": history,
+                    "updates": updates,
+                    "image": image,
+                    "graph": graph,
+                    "wiki": wiki
+                })
+            return
+
+        yield _frame({
+            "type": "start",
             "image": image,
             "graph": graph,
-            "wiki": wiki
-        }
-        yield json.dumps(result, ensure_ascii=False).encode('utf8') + b'\n'
+            "wiki": wiki,
+            "references": {"entities": entities, "triples": triples},
+        })
+
+        sent = ""
+        updates = {}
+        for history, updates in steps:
+            response = updates.get("response", "")
+            # 模型后处理可能改写已输出的字符（如标点），从第一个不同的位置重发
+            offset = 0
+            for a, b in zip(sent, response):
+                if a != b:
+                    break
+                offset += 1
+            if offset < len(sent) or offset < len(response):
+                yield _frame({"type": "delta", "offset": offset, "text": response[offset:]})
+            sent = response
+
+        yield _frame({"type": "end", "updates": updates, "history": history})
+    finally:
+        if stream is not None:
+            stream.close()
 
 # 加载模型
 def start_model():
-    global model, tokenizer, init_history
+    global model, tokenizer, init_history, prefix_cache
 
     # 从配置系统获取模型路径
     model_path = settings.CHATGLM_MODEL_PATH
@@ -149,20 +276,50 @@ def start_model():
     else:
         print(f"使用HuggingFace Hub模型: {model_path}")
     
-    tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
-    model = AutoModel.from_pretrained(model_path, trust_remote_code=True)
-    
+    from transformers import AutoTokenizer, AutoModel
+    loaded_tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
+
     # 检查CUDA是否可用
     import torch
     if torch.cuda.is_available():
         print("使用GPU (CUDA)")
-        model = model.half().cuda()
+        loaded_model = AutoModel.from_pretrained(model_path, trust_remote_code=True).half().cuda()
+    elif settings.CPU_QUANTIZE:
+        print("使用CPU（Linear 层动态 int8 量化）")
+        from app.utils.cpu_quant import load_cpu_model
+        loaded_model = load_cpu_model(model_path, settings.CPU_QUANT_CACHE_PATH)
     else:
-        print("使用CPU（注意：CPU模式速度较慢）")
-        model = model.float()
+        print("使用CPU（注意：CPU模式速度较慢，可设置 CPU_QUANTIZE=true 使用 int8 量化）")
+        loaded_model = AutoModel.from_pretrained(model_path, trust_remote_code=True).float()
     
-    model.eval()
+    loaded_model.eval()
 
     pre_prompt = "你叫 ChatKG，是一个图谱问答机器人，此为背景。下面开始聊天吧！"
-    _, history = predict(pre_prompt, [])
-    init_history = history
\ No newline at end of file
+    cache = None
+    if settings.PREFIX_CACHE_ENABLED:
+        # 系统提示只计算一次，缓存其 KV，每段对话的第一轮从缓存的前缀开始生成
+        history, cache = PrefixCache.build(loaded_model, loaded_tokenizer, pre_prompt)
+    else:
+        _, history = loaded_model.chat(loaded_tokenizer, pre_prompt, [])
+
+    decoder = None
+    if settings.GENERATION_BATCHED:
+        # 批量解码的 prefill 按序列单独计算，不使用前缀缓存；前缀缓存只在回退的逐个生成路径上生效
+        from app.utils.batch_decoder import HFBatchDecoder
+        decoder = HFBatchDecoder.build(loaded_model, loaded_tokenizer)
+
+    # 服务在模型加载期间已在接受请求，全部准备好后再发布；请求以 model 是否为 None 判断模型是否就绪，
+    # 所以 model 必须最后赋值，请求看到 model 时 tokenizer、init_history、prefix_cache、解码器都已就绪
+    tokenizer, init_history, prefix_cache = loaded_tokenizer, history, cache
+    scheduler.decoder = decoder
+    model = loaded_model
+
+
+# 各组件在后台线程中并行加载（main.py 中调用 components.start()），加载完成前相关功能自动降级：
+# 模型未就绪时回复“模型加载中”，其余组件未就绪时跳过对应的检索源
+components.register("model", start_model)
+components.register("ner", _load_ner)
+components.register("graph", lambda: graph_store.get().gazetteer)
+components.register("image_searcher", ImageSearcher)
+components.register("wiki_searcher", _load_wiki_searcher)
+components.register("opencc", lambda: OpenCC('t2s'))
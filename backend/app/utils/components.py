@@ -0,0 +1,77 @@
+import threading
+import time
+import traceback
+
+
+class Component:
+    '''一个需要加载的组件：状态依次为 pending -> loading -> ready / failed'''
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.status = 'pending'
+        self.value = None
+        self.error = None
+        self.seconds = None
+        self.loaded = threading.Event()
+
+
+class ComponentRegistry:
+    '''后台并行加载的组件
+
+    register() 登记组件的加载函数，start() 为每个组件启动一个后台线程同时加载，
+    启动耗时从各组件之和变为其中最慢的一个，服务在加载期间即可接受请求。
+    get() 只在组件加载完成后返回其值，否则返回默认值，调用方据此降级（如跳过 NER、提示模型加载中）。
+    '''
+
+    def __init__(self):
+        self._components = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        self._components[name] = Component(name, loader)
+
+    def start(self):
+        with self._lock:
+            for component in self._components.values():
+                if component.status == 'pending':
+                    component.status = 'loading'
+                    threading.Thread(target=self._load, args=(component,), name=f'load-{component.name}', daemon=True).start()
+
+    def _load(self, component):
+        start = time.monotonic()
+        try:
+            component.value = component.loader()
+            component.status = 'ready'
+            print(f"组件加载完成: {component.name} ({time.monotonic() - start:.1f}s)")
+        except Exception as e:
+            component.error = str(e)
+            component.status = 'failed'
+            print(f"组件加载失败: {component.name}: {e}")
+            traceback.print_exc()
+        finally:
+            component.seconds = time.monotonic() - start
+            component.loaded.set()
+
+    def get(self, name, default=None):
+        component = self._components[name]
+        return component.value if component.status == 'ready' else default
+
+    def is_ready(self, *names):
+        names = names or self._components.keys()
+        return all(self._components[name].status == 'ready' for name in names)
+
+    def wait(self, name, timeout=None):
+        '''等待组件加载结束（成功或失败），返回是否已就绪'''
+        self._components[name].loaded.wait(timeout)
+        return self.is_ready(name)
+
+    def status(self):
+        return {
+            name: {'status': c.status, 'seconds': c.seconds, 'error': c.error}
+            for name, c in self._components.items()
+        }
+
+
+# 进程内共享的组件注册表
+components = ComponentRegistry()
@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+
+# 作为脚本运行时（基准测试），添加项目根目录到路径，以便导入 config 模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+import torch
+from transformers import AutoConfig, AutoModel
+
+from config.settings import settings
+
+
+def quantize(model):
+    '''对所有 Linear 层做动态 int8 量化（权重离线量化，激活在推理时按批量化），只用于 CPU 推理
+
+    原地替换 Linear 层，不先 deepcopy 整个 fp32 模型，量化时内存峰值不会翻倍；传入的模型随之变为 int8。
+    '''
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def model_footprint(model):
+    '''模型权重（含量化后打包的权重）占用的字节数'''
+    def nbytes(value):
+        if isinstance(value, torch.Tensor):
+            return value.numel() * value.element_size()
+        if isinstance(value, (tuple, list)):
+            return sum(nbytes(v) for v in value)
+        return 0
+
+    return sum(nbytes(value) for value in model.state_dict().values())
+
+
+def _cache_meta(model_path):
+    return {"model_path": str(model_path), "torch": torch.__version__}
+
+
+def load_cpu_model(model_path, cache_path=""):
+    '''加载 CPU 推理用的 int8 模型
+
+    cache_path 不为空时，量化后的整个模型保存到该文件，之后启动直接加载，跳过 fp32 权重加载和量化；
+    模型路径或 torch 版本变化时缓存失效并重新生成。
+    '''
+    if cache_path and os.path.exists(cache_path):
+        try:
+            # 先加载配置，注册 trust_remote_code 的模型代码，反序列化时才能找到模型类
+            AutoConfig.from_pretrained(model_path, trust_remote_code=True)
+            cached = torch.load(cache_path, map_location="cpu", weights_only=False)
+            if cached.get("meta") == _cache_meta(model_path):
+                print(f"使用已缓存的 int8 模型: {cache_path}")
+                return cached["model"]
+            print("int8 模型缓存与当前模型不匹配，重新量化")
+        except Exception as e:
+            print(f"int8 模型缓存加载失败，重新量化: {e}")
+
+    model = AutoModel.from_pretrained(model_path, trust_remote_code=True).float()
+    fp32_bytes = model_footprint(model)
+    model = quantize(model)
+    print(f"int8 量化完成，权重占用 {fp32_bytes / 2**20:.0f} MB -> {model_footprint(model) / 2**20:.0f} MB")
+
+    if cache_path:
+        if os.path.dirname(cache_path):
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        torch.save({"meta": _cache_meta(model_path), "model": model}, tmp_path)
+        os.replace(tmp_path, cache_path)
+        print(f"int8 模型已缓存到: {cache_path}")
+
+    return model
+
+
+def benchmark(model, tokenizer, query="介绍一下舰艇损管的基本原则", max_new_tokens=32):
+    '''贪心生成 max_new_tokens 个 token，返回每秒生成的 token 数（stream_chat 每一步产出一个 token）'''
+    steps = 0
+    start = time.perf_counter()
+    with torch.no_grad():
+        for _ in model.stream_chat(tokenizer, query, [], do_sample=False, max_new_tokens=max_new_tokens):
+            steps += 1
+    return steps / (time.perf_counter() - start)
+
+
+def main():
+    import argparse
+    from transformers import AutoTokenizer
+
+    parser = argparse.ArgumentParser(description="比较 CPU 上 fp32 与动态 int8 量化模型的权重占用和生成速度")
+    parser.add_argument("--model", default=settings.CHATGLM_MODEL_PATH, help="模型路径")
+    parser.add_argument("--tokens", type=int, default=32, help="每次生成的 token 数")
+    parser.add_argument("--threads", type=int, default=0, help="torch CPU 线程数（0 为默认）")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model, trust_remote_code=True)
+    model = AutoModel.from_pretrained(args.model, trust_remote_code=True).float().eval()
+
+    # 先测 fp32，再原地量化同一个模型测 int8，全程只占一份 fp32 权重
+    rows = [("fp32", model_footprint(model), benchmark(model, tokenizer, max_new_tokens=args.tokens))]
+    model = quantize(model)
+    rows.append(("int8", model_footprint(model), benchmark(model, tokenizer, max_new_tokens=args.tokens)))
+
+    print(f"{'mode':<6}{'weights (MB)':>14}{'tokens/s':>10}")
+    for mode, size, speed in rows:
+        print(f"{mode:<6}{size / 2**20:>14.0f}{speed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
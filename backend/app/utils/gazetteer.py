@@ -0,0 +1,46 @@
+import os
+
+# 抽取三元组时混入图谱的虚词、疑问词和泛化词，它们几乎出现在每个问题里，不能当作实体
+STOPWORDS = frozenset('''
+什么 哪些 哪个 哪里 怎么 怎样 怎么样 如何 为什么 为何 多少 是否 是不是 有没有 能否 可否
+要注意 注意 注意事项 需要 应该 应当 必须 可以 能够 进行 使用 采用 利用 通过 包括 以及 或者
+基本 原则 方法 方式 问题 情况 时候 作用 方面 主要 一般 要求 内容 过程 措施 步骤 特点 目的
+'''.split())
+
+
+def load_stopwords(path=''):
+    '''内置停用词加上 path 中的额外停用词（每行一个，文件不存在时忽略）'''
+    words = set(STOPWORDS)
+    if path and os.path.exists(path):
+        with open(path, encoding='utf8') as f:
+            words.update(line.strip() for line in f if line.strip())
+    return frozenset(words)
+
+
+class Gazetteer:
+    '''基于图谱节点名称的词典实体链接器
+
+    复用节点名称索引中的 Aho-Corasick 自动机，对问题做一次线性扫描，
+    再按最长优先选出不重叠的节点名称作为实体，停用词中的名称不链接。
+    只有链接到足够具体（不短于 specific_length）的名称时，图谱内的问题才无需调用 NER 模型。
+    '''
+
+    def __init__(self, automaton, names, min_length=2, stopwords=STOPWORDS, specific_length=3):
+        self.automaton = automaton
+        self.names = names
+        self.min_length = min_length
+        self.stopwords = stopwords
+        self.specific_length = specific_length
+
+    def link(self, text):
+        '''返回问题中出现的节点名称（按出现顺序，去重，跳过停用词）'''
+        entities = []
+        for _, _, idx in self.automaton.longest_matches(text, self.min_length):
+            name = self.names[idx]
+            if name not in self.stopwords and name not in entities:
+                entities.append(name)
+        return entities
+
+    def is_specific(self, entities):
+        '''链接结果中是否有足够具体的名称，可以代替 NER 的结果'''
+        return any(len(name) >= self.specific_length for name in entities)
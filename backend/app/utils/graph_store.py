@@ -0,0 +1,454 @@
+import bisect
+import hashlib
+import json
+import os
+import threading
+from functools import cached_property
+
+import numpy as np
+
+from app.utils.gazetteer import Gazetteer, load_stopwords
+from app.utils.name_index import NameIndex
+from config.settings import settings
+
+
+def graph_fingerprint(path):
+    '''data.json 的内容指纹（字节数 + sha1），须与 utils/convert_kg_to_server_data.py 中的 graph_fingerprint 保持一致'''
+    digest = hashlib.sha1()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return {'size': size, 'sha1': digest.hexdigest()}
+
+
+class StringTable:
+    '''内存映射的字符串表：data 为所有字符串 UTF-8 编码后首尾相接的字节，offsets[i]:offsets[i+1] 为第 i 个字符串'''
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        return bytes(self.data[self.offsets[idx]:self.offsets[idx + 1]]).decode('utf-8')
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+class NodeTable:
+    '''二进制图谱中的节点列，按下标访问时才拼出与 data.json 相同的节点字典'''
+
+    def __init__(self, names, value, category, symbol_size, draggable, lines_offsets, lines):
+        self.names = names
+        self.value = value
+        self.category = category
+        self.symbol_size = symbol_size
+        self.draggable = draggable
+        self.lines_offsets = lines_offsets
+        self.lines = lines
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, idx):
+        return {
+            'id': str(idx),
+            'name': self.names[idx],
+            'category': int(self.category[idx]),
+            'draggable': bool(self.draggable[idx]),
+            'value': int(self.value[idx]),
+            'lines': self.lines[self.lines_offsets[idx]:self.lines_offsets[idx + 1]].tolist(),
+            'symbolSize': int(self.symbol_size[idx]),
+        }
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+class Graph:
+    '''一份只读的知识图谱快照
+
+    节点保留 data.json 中的原始字典，边按列拆成 numpy 数组（source / target / label / sent），
+    关系名称放在字符串表 labels 中。调用方不能修改这里的任何对象，需要修改时使用 node() / link() 拿副本。
+    '''
+
+    def __init__(self, nodes, sents, labels, link_source, link_target, link_label, link_sent, version=0, mtime=None,
+                 node_stats=None, label_stats=None, names=None):
+        self.nodes = nodes
+        self.sents = sents
+        self.labels = labels
+        self.link_source = link_source
+        self.link_target = link_target
+        self.link_label = link_label
+        self.link_sent = link_sent
+        self.version = version
+        self.mtime = mtime
+
+        # 转换脚本生成的统计信息（in_degree / out_degree / pagerank / component），没有 sidecar 时为 None
+        self.node_stats = node_stats
+        self.label_stats = label_stats
+
+        self.names = names if names is not None else [node['name'] for node in nodes]
+
+    @cached_property
+    def name_to_id(self):
+        return {name: idx for idx, name in enumerate(self.names)}
+
+    @property
+    def num_nodes(self):
+        return len(self.nodes)
+
+    @property
+    def num_links(self):
+        return len(self.link_source)
+
+    @cached_property
+    def name_index(self):
+        '''节点名称倒排索引，首次使用时构建'''
+        return NameIndex(self.names)
+
+    @cached_property
+    def gazetteer(self):
+        '''基于节点名称的词典实体链接器'''
+        return Gazetteer(self.name_index.automaton, self.names, settings.GAZETTEER_MIN_LENGTH,
+                         load_stopwords(settings.GAZETTEER_STOPWORDS_PATH), settings.GAZETTEER_SPECIFIC_LENGTH)
+
+    @cached_property
+    def csr(self):
+        '''无向邻接表（CSR 格式）：(offsets, neighbors, edge_ids)
+
+        节点 i 的相邻节点为 neighbors[offsets[i]:offsets[i + 1]]，对应的边 id 在 edge_ids 的同一区间，
+        区间内按边 id 升序排列。自环只记录一次。
+        '''
+        num_links = self.num_links
+        edge_range = np.arange(num_links, dtype=np.int32)
+        not_loop = self.link_source != self.link_target
+
+        heads = np.concatenate([self.link_source, self.link_target[not_loop]])
+        tails = np.concatenate([self.link_target, self.link_source[not_loop]])
+        edge_ids = np.concatenate([edge_range, edge_range[not_loop]])
+
+        order = np.lexsort((edge_ids, heads))
+        offsets = np.zeros(self.num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(heads, minlength=self.num_nodes), out=offsets[1:])
+
+        return offsets, tails[order], edge_ids[order]
+
+    @property
+    def degree(self):
+        '''每个节点的（无向）度数'''
+        return np.diff(self.csr[0])
+
+    @cached_property
+    def node_value(self):
+        '''节点的 value（三元组中出现的次数）'''
+        if isinstance(self.nodes, NodeTable):
+            return np.asarray(self.nodes.value, dtype=np.float64)
+        return np.fromiter((node.get('value', 1) for node in self.nodes), dtype=np.float64, count=self.num_nodes)
+
+    @cached_property
+    def label_prior(self):
+        '''关系标签的先验权重：出现越少的关系信息量越大（归一化到 [0, 1] 的 idf）'''
+        counts = np.bincount(self.link_label, minlength=len(self.labels)).astype(np.float64)
+        idf = np.log((self.num_links + 1) / (counts + 1))
+        return idf / idf.max() if len(idf) and idf.max() > 0 else idf
+
+    @cached_property
+    def importance(self):
+        '''节点重要度，归一化到 [0, 1]：有统计信息时用 PageRank，否则用度数和 value 的对数'''
+        if self.node_stats is not None:
+            score = np.asarray(self.node_stats['pagerank'], dtype=np.float64)
+        else:
+            score = np.log1p(np.maximum(self.degree, self.node_value))
+        top = score.max(initial=0)
+        return score / top if top > 0 else score
+
+    @cached_property
+    def importance_order(self):
+        '''按重要度从高到低排列的节点 id'''
+        return np.argsort(-self.importance, kind='stable')
+
+    @cached_property
+    def name_order(self):
+        '''(按名称排序的名称列表, 对应的节点 id)，用于前缀搜索'''
+        order = sorted(range(self.num_nodes), key=self.names.__getitem__)
+        return [self.names[idx] for idx in order], np.asarray(order, dtype=np.int64)
+
+    def top_nodes(self, limit):
+        '''重要度最高的 limit 个节点'''
+        return self.importance_order[:limit].tolist()
+
+    def top_by_importance(self, node_ids, limit):
+        '''从 node_ids 中取重要度最高的 limit 个，按重要度从高到低返回'''
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        if len(node_ids) > limit:
+            node_ids = node_ids[np.argpartition(-self.importance[node_ids], limit - 1)[:limit]]
+        return node_ids[np.argsort(-self.importance[node_ids], kind='stable')].tolist()
+
+    def prefix_search(self, prefix, limit):
+        '''名称以 prefix 开头的节点，按重要度取前 limit 个'''
+        sorted_names, order = self.name_order
+        lo = bisect.bisect_left(sorted_names, prefix)
+        hi = bisect.bisect_left(sorted_names, prefix + '\U0010ffff')
+        return self.top_by_importance(order[lo:hi], limit)
+
+    def neighbors(self, idx, limit):
+        '''节点 idx 的相邻节点，按重要度取前 limit 个'''
+        offsets, neighbors, _ = self.csr
+        nodes = np.unique(neighbors[offsets[idx]:offsets[idx + 1]])
+        return self.top_by_importance(nodes[nodes != idx], limit)
+
+    def induced_edges(self, node_ids, limit):
+        '''两个端点都在 node_ids 中的边，最多 limit 条（按边 id 升序）'''
+        mask = np.zeros(self.num_nodes, dtype=bool)
+        mask[np.asarray(node_ids, dtype=np.int64)] = True
+        return np.flatnonzero(mask[self.link_source] & mask[self.link_target])[:limit].tolist()
+
+    def expand(self, seeds, depth=1, max_fanout=None, max_edges=None):
+        '''从 seeds 出发做有界的 k 跳 BFS，返回途经的边 id
+
+        Args:
+            seeds: 起始节点 id 列表
+            depth: 扩展的跳数
+            max_fanout: 每一跳中每个节点最多取的边数，可以是整数或按跳数给出的列表（列表不够长时沿用最后一个值），
+                0 / None 表示不限制
+            max_edges: 返回边数的总上限，0 / None 表示不限制
+        Returns:
+            edge_ids: 按跳数先后排列的边 id（同一跳内按边 id 升序）
+        '''
+        offsets, neighbors, csr_edges = self.csr
+
+        node_seen = np.zeros(self.num_nodes, dtype=bool)
+        edge_seen = np.zeros(self.num_links, dtype=bool)
+        frontier = np.unique(np.asarray(seeds, dtype=np.int64))
+        node_seen[frontier] = True
+
+        result = []
+        total = 0
+        for hop in range(depth):
+            if len(frontier) == 0 or (max_edges and total >= max_edges):
+                break
+
+            # 取出 frontier 中所有节点在 CSR 中的区间
+            starts = offsets[frontier]
+            lengths = offsets[frontier + 1] - starts
+            owner = np.repeat(np.arange(len(frontier)), lengths)
+            positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+            hop_edges = csr_edges[positions]
+            hop_nodes = neighbors[positions]
+            keep = ~edge_seen[hop_edges]
+            hop_edges, hop_nodes, owner = hop_edges[keep], hop_nodes[keep], owner[keep]
+
+            # 每个节点只保留前 fanout 条未访问过的边
+            fanout = max_fanout
+            if isinstance(max_fanout, (list, tuple)):
+                fanout = max_fanout[min(hop, len(max_fanout) - 1)] if max_fanout else None
+            if fanout:
+                rank = np.arange(len(owner)) - np.searchsorted(owner, owner, side='left')
+                keep = rank < fanout
+                hop_edges, hop_nodes = hop_edges[keep], hop_nodes[keep]
+
+            hop_edges, first = np.unique(hop_edges, return_index=True)
+            if max_edges and total + len(hop_edges) > max_edges:
+                first = first[:max_edges - total]
+                hop_edges = hop_edges[:max_edges - total]
+                hop_nodes = hop_nodes[np.sort(first)]
+
+            edge_seen[hop_edges] = True
+            result.append(hop_edges)
+            total += len(hop_edges)
+
+            frontier = np.unique(hop_nodes[~node_seen[hop_nodes]])
+            node_seen[frontier] = True
+
+        if not result:
+            return []
+        return np.concatenate(result).tolist()
+
+    def node(self, idx):
+        '''返回节点的副本，lines 也一并复制'''
+        node = dict(self.nodes[idx])
+        node['lines'] = list(node.get('lines', []))
+        return node
+
+    def link(self, idx):
+        '''按 data.json 的格式还原一条边（新建的字典）'''
+        return {
+            'source': int(self.link_source[idx]),
+            'target': int(self.link_target[idx]),
+            'name': self.labels[self.link_label[idx]],
+            'sent': int(self.link_sent[idx]),
+        }
+
+    def to_dict(self):
+        '''还原成 data.json 的完整结构，供 /graph/ 接口返回'''
+        return {
+            'nodes': self.nodes if isinstance(self.nodes, list) else list(self.nodes),
+            'links': [self.link(i) for i in range(self.num_links)],
+            'sents': self.sents if isinstance(self.sents, list) else list(self.sents),
+        }
+
+    @classmethod
+    def from_dict(cls, data, version=0, mtime=None, **kwargs):
+        links = data.get('links', [])
+
+        labels = []
+        label_to_id = {}
+        link_label = np.empty(len(links), dtype=np.int32)
+        for i, link in enumerate(links):
+            name = link['name']
+            if name not in label_to_id:
+                label_to_id[name] = len(labels)
+                labels.append(name)
+            link_label[i] = label_to_id[name]
+
+        link_source = np.fromiter((int(link['source']) for link in links), dtype=np.int32, count=len(links))
+        link_target = np.fromiter((int(link['target']) for link in links), dtype=np.int32, count=len(links))
+        link_sent = np.fromiter((int(link['sent']) for link in links), dtype=np.int32, count=len(links))
+
+        return cls(data.get('nodes', []), data.get('sents', []), labels,
+                   link_source, link_target, link_label, link_sent, version=version, mtime=mtime, **kwargs)
+
+    @classmethod
+    def from_binary(cls, path, version=0, mtime=None, **kwargs):
+        '''以内存映射方式打开转换脚本生成的二进制图谱目录（格式见 convert_kg_to_server_data.save_graph_binary）'''
+        def load(name):
+            return np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+
+        def load_strings(name):
+            return StringTable(load(name), load(f'{name}_offsets'))
+
+        names = list(load_strings('names'))
+        nodes = NodeTable(names, load('node_value'), load('node_category'), load('node_symbol_size'),
+                          load('node_draggable'), load('node_lines_offsets'), load('node_lines'))
+
+        return cls(nodes, load_strings('sents'), list(load_strings('labels')),
+                   load('link_source'), load('link_target'), load('link_label'), load('link_sent'),
+                   version=version, mtime=mtime, names=names, **kwargs)
+
+
+class GraphStore:
+    '''进程级共享的图谱存储
+
+    图谱只在第一次 get() 时加载，chat 与 graph 蓝图共用同一份快照。data.json 旁边的二进制目录（data.graph/）
+    记录的 data.json 指纹与当前文件一致时优先内存映射二进制格式，否则解析 data.json。
+    reload() 会重新加载并原子地替换快照，正在使用旧快照的请求不受影响。
+    '''
+
+    def __init__(self, path=None):
+        self.path = str(path or settings.GRAPH_DATA_PATH)
+        # 转换脚本在 data.json 旁边生成的二进制图谱（data.graph/）与统计信息（data.stats/）目录
+        self.binary_path = os.path.splitext(self.path)[0] + '.graph'
+        self.stats_path = os.path.splitext(self.path)[0] + '.stats'
+        self._graph = None
+        self._version = 0
+        self._loaded_stamp = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        graph = self._graph
+        if graph is None:
+            with self._lock:
+                if self._graph is None:
+                    self._graph = self._load()
+                graph = self._graph
+        return graph
+
+    def reload(self):
+        '''强制重新加载图谱文件，返回新的快照'''
+        with self._lock:
+            self._graph = self._load()
+            return self._graph
+
+    def refresh(self):
+        '''图谱文件有变化（任一文件的 mtime 不同）时才重新加载'''
+        graph = self.get()
+        if self._stamp() != self._loaded_stamp:
+            with self._lock:
+                if self._graph is graph:
+                    self._graph = self._load()
+                graph = self._graph
+        return graph
+
+    def _stamp(self):
+        '''data.json、data.graph/meta.json、data.stats/meta.json 的 mtime，只用来发现文件变化'''
+        def mtime_of(path):
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                return None
+
+        return tuple(mtime_of(path) for path in (self.path, os.path.join(self.binary_path, 'meta.json'),
+                                                 os.path.join(self.stats_path, 'meta.json')))
+
+    def _binary_meta(self, source):
+        '''二进制目录的 meta.json；它记录的 data.json 指纹与 source 不同（二进制已过期）时返回 None
+
+        没有 data.json（source 为 None）时直接使用二进制格式。
+        '''
+        meta_path = os.path.join(self.binary_path, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if source is not None and meta.get('source') != source:
+            print(f"二进制图谱不是由当前图谱生成的，改为解析 data.json: {self.binary_path}")
+            return None
+        return meta
+
+    def _load(self):
+        stamp = self._stamp()
+        source = graph_fingerprint(self.path) if os.path.exists(self.path) else None
+        meta = self._binary_meta(source)
+        if meta is not None:
+            source = meta.get('source')
+            num_nodes = meta['nodes']
+        else:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            num_nodes = len(data.get('nodes', []))
+
+        node_stats, label_stats = self._load_stats(num_nodes, source)
+
+        self._version += 1
+        self._loaded_stamp = stamp
+        mtime = max((t for t in stamp if t is not None), default=None)
+        if meta is not None:
+            return Graph.from_binary(self.binary_path, version=self._version, mtime=mtime,
+                                     node_stats=node_stats, label_stats=label_stats)
+        return Graph.from_dict(data, version=self._version, mtime=mtime, node_stats=node_stats, label_stats=label_stats)
+
+    def _load_stats(self, num_nodes, source):
+        '''以内存映射方式读取统计信息 sidecar
+
+        sidecar 的 meta.json 记录了生成它的 data.json 的指纹，与 source（当前 data.json 的指纹）不同时
+        说明 data.json 已重新生成或被替换（即使节点数相同），此时和文件缺失一样返回 (None, None)。
+        '''
+        nodes_path = os.path.join(self.stats_path, 'nodes.npy')
+        labels_path = os.path.join(self.stats_path, 'labels.npy')
+        meta_path = os.path.join(self.stats_path, 'meta.json')
+        if not (os.path.exists(nodes_path) and os.path.exists(labels_path) and os.path.exists(meta_path)):
+            return None, None
+
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            if json.load(f).get('source') != source:
+                print(f"统计信息不是由当前图谱生成的，已忽略: {self.stats_path}")
+                return None, None
+
+        node_stats = np.load(nodes_path, mmap_mode='r')
+        label_stats = np.load(labels_path, mmap_mode='r')
+        if len(node_stats) != num_nodes:
+            print(f"统计信息与图谱不一致，已忽略: {self.stats_path}")
+            return None, None
+        return node_stats, label_stats
+
+
+graph_store = GraphStore()
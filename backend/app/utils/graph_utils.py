@@ -1,61 +1,90 @@
-import json
+import heapq
 
+from app.utils.graph_store import graph_store
+from config.settings import settings
 
-def search_node_item(user_input, lite_graph=None):
-    with open('data/data.json', 'r') as f:
-        data = json.load(f)
 
-    if lite_graph is None:
-        lite_graph = {
+# rank_triples 中各项信号的权重
+QUERY_OVERLAP_WEIGHT = 1.0
+COOCCURRENCE_WEIGHT = 0.5
+LABEL_PRIOR_WEIGHT = 0.3
+NODE_WEIGHT = 0.2
+
+
+class SubgraphBuilder:
+    '''把原图中的若干条边抽取为独立的子图（lite graph）
+
+    节点、边、句子分别用原图 id -> 子图 id 的字典去重，输出的都是新建的对象，原图快照保持不变。
+    同一个 builder 可以连续加入多批边（例如多个实体的检索结果），结果会自动合并。
+    '''
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.node_map = {}   # 原节点 id -> 子图节点 id
+        self.sent_map = {}   # 原句子 id -> 子图句子 id
+        self.edge_ids = []     # 已加入的原边 id（按加入顺序）
+        self.edge_set = set()
+        self.lite_graph = {
             'nodes': [],
             'links': [],
             'sents': []
         }
 
+    def _add_node(self, idx):
+        if idx not in self.node_map:
+            node = self.graph.node(idx)
+            node['id'] = len(self.lite_graph['nodes'])
+            self.node_map[idx] = node['id']
+            self.lite_graph['nodes'].append(node)
+        return self.node_map[idx]
+
+    def _add_sent(self, idx):
+        if idx not in self.sent_map:
+            self.sent_map[idx] = len(self.lite_graph['sents'])
+            self.lite_graph['sents'].append(self.graph.sents[idx])
+        return self.sent_map[idx]
+
+    def add_edges(self, edge_ids):
+        for edge_id in edge_ids:
+            if edge_id in self.edge_set:
+                continue
+            self.edge_set.add(edge_id)
+            self.edge_ids.append(edge_id)
+
+            edge = self.graph.link(edge_id)
+            edge['sent'] = self._add_sent(edge['sent'])
+            edge['source'] = self._add_node(edge['source'])
+            edge['target'] = self._add_node(edge['target'])
+            self.lite_graph['links'].append(edge)
+
+        return self.lite_graph
+
+
+def search_node_item(user_input, lite_graph=None, depth=None, max_fanout=None, max_edges=None):
+    '''以名称与 user_input 互相包含的节点为起点，按邻接关系扩展 depth 跳，构建子图
+
+    lite_graph 为 SubgraphBuilder 时把结果合并进去，否则新建一个子图。
+    depth / max_fanout / max_edges 未指定时使用配置中的 GRAPH_SEARCH_DEPTH / GRAPH_HOP_FANOUT / GRAPH_MAX_EDGES。
+    '''
+    builder = lite_graph if isinstance(lite_graph, SubgraphBuilder) else SubgraphBuilder(graph_store.get())
+    graph = builder.graph
+
     # 利用thefuzz库来选取最相近的节点
     # node_names = [node['name'] for node in data['nodes']]
     # user_input = process.extractOne(user_input, node_names)[0]
 
-    DEEP = 1
-
-    # search node
-    search_nodes = [user_input]
-    for d in range(DEEP):
-        for serch_node in search_nodes:
-            for edge in data['links']:
-                source = data['nodes'][int(edge['source'])]
-                target = data['nodes'][int(edge['target'])]
-                if source['name'] in serch_node or serch_node in source['name'] or target['name'] in serch_node or serch_node in target['name']:
-                # if source['name'] == serch_node or target['name'] == serch_node:
-                    sent = data['sents'][edge['sent']]
-                    if sent not in lite_graph['sents']:
-                        edge['sent'] = len(lite_graph['sents'])
-                        lite_graph['sents'].append(sent)
-                    else:
-                        edge['sent'] = lite_graph['sents'].index(sent)
-
-                    if source not in lite_graph['nodes']:
-                        source['id'] = len(lite_graph['nodes'])
-                        lite_graph['nodes'].append(source)
-                    else:
-                        source['id'] = lite_graph['nodes'].index(source)
-
-                    if target not in lite_graph['nodes']:
-                        target['id'] = len(lite_graph['nodes'])
-                        lite_graph['nodes'].append(target)
-                    else:
-                        target['id'] = lite_graph['nodes'].index(target)
-
-                    edge['source'] = source['id']
-                    edge['target'] = target['id']
-                    lite_graph['links'].append(edge)
-
-        if len(lite_graph['nodes']) == 0:
-            break
+    if depth is None:
+        depth = settings.GRAPH_SEARCH_DEPTH
+    if max_fanout is None:
+        max_fanout = settings.GRAPH_HOP_FANOUT
+    if max_edges is None:
+        max_edges = settings.GRAPH_MAX_EDGES
 
-        search_nodes = [node['name'] for node in lite_graph['nodes']]
+    # 通过名称索引找到起始节点，再沿 CSR 邻接表做有界 BFS
+    seeds = graph.name_index.match(user_input)
+    edge_ids = graph.expand(seeds, depth=depth, max_fanout=max_fanout, max_edges=max_edges)
 
-    return lite_graph
+    return builder.add_edges(edge_ids)
 
 
 def convert_graph_to_triples(graph, entity=None):
@@ -70,4 +99,59 @@ def convert_graph_to_triples(graph, entity=None):
         else:
             triples.append((source['name'], link["name"], target['name']))
 
-    return triples
\ No newline at end of file
+    return triples
+
+
+def rank_triples(graph, edge_ids, user_input, entities, k=10):
+    '''从候选边中选出得分最高的 k 个三元组
+
+    只考虑至少一端名称包含某个实体的边（与 convert_graph_to_triples 的过滤一致），得分由以下信号加权得到：
+    端点名称 / 关系名称是否出现在问题中、边所在句子中出现的实体数、关系标签先验、端点的重要度（PageRank 或度数）。
+    候选边逐条打分并放入大小为 k 的堆中，不会先生成完整的三元组列表。
+
+    Args:
+        graph: 图谱快照
+        edge_ids: 候选边 id（原图 id）
+        user_input: 用户问题
+        entities: 问题中识别出的实体
+        k: 返回的三元组数量
+    Returns:
+        triples: [(source, relation, target), ...]，按得分从高到低排列
+    '''
+    if not entities or k <= 0:
+        return []
+
+    importance = graph.importance
+    label_prior = graph.label_prior
+
+    sent_cache = {}
+
+    def cooccurrence(sent_id):
+        if sent_id not in sent_cache:
+            sent = graph.sents[sent_id]
+            sent_cache[sent_id] = sum(1 for ent in entities if ent in sent) / len(entities)
+        return sent_cache[sent_id]
+
+    def candidates():
+        seen = set()
+        for edge_id in edge_ids:
+            source = int(graph.link_source[edge_id])
+            target = int(graph.link_target[edge_id])
+            label = int(graph.link_label[edge_id])
+            source_name, target_name = graph.names[source], graph.names[target]
+            if not any(ent in source_name or ent in target_name for ent in entities):
+                continue
+            if (source, label, target) in seen:
+                continue
+            seen.add((source, label, target))
+
+            overlap = ((source_name in user_input) + (target_name in user_input) + (graph.labels[label] in user_input)) / 3
+            node_score = (importance[source] + importance[target]) / 2
+            score = (QUERY_OVERLAP_WEIGHT * overlap
+                     + COOCCURRENCE_WEIGHT * cooccurrence(int(graph.link_sent[edge_id]))
+                     + LABEL_PRIOR_WEIGHT * label_prior[label]
+                     + NODE_WEIGHT * node_score)
+            # 得分相同时边 id 小的优先，保证结果稳定
+            yield score, -edge_id, (source_name, graph.labels[label], target_name)
+
+    return [triple for _, _, triple in heapq.nlargest(k, candidates())]
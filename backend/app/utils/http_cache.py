@@ -0,0 +1,62 @@
+import gzip
+import hashlib
+import zlib
+
+from flask import Response
+from werkzeug.http import http_date
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，没有安装时退回 deflate
+    brotli = None
+
+
+class PrecompressedPayload:
+    '''预先压缩好的响应体
+
+    同一份内容只序列化、压缩一次，之后按请求的 Accept-Encoding 直接返回对应的字节，
+    并用强 ETag / Last-Modified 支持条件请求（If-None-Match / If-Modified-Since 命中时返回 304）。
+    '''
+
+    def __init__(self, body, last_modified=None, content_type='application/json'):
+        self.content_type = content_type
+        self.last_modified = last_modified
+        self.etag = hashlib.sha1(body).hexdigest()
+
+        self.encodings = {'identity': body, 'gzip': gzip.compress(body, compresslevel=6)}
+        if brotli is not None:
+            self.encodings['br'] = brotli.compress(body)
+        else:
+            self.encodings['deflate'] = zlib.compress(body, 6)
+
+    def etag_for(self, encoding):
+        '''每种编码的表示各自有强 ETag（identity 为内容的 sha1，其余追加编码名），缓存和 Range 请求不会混用不同编码'''
+        return self.etag if encoding == 'identity' else f'{self.etag}-{encoding}'
+
+    def _not_modified(self, request):
+        if request.if_none_match:
+            # 客户端持有任一编码的表示都说明内容没有变化
+            return any(request.if_none_match.contains(self.etag_for(encoding)) for encoding in self.encodings)
+        if request.if_modified_since and self.last_modified is not None:
+            return int(self.last_modified) <= request.if_modified_since.timestamp()
+        return False
+
+    def respond(self, request):
+        # 按 br > gzip > deflate 的顺序选择客户端支持的编码
+        encoding = 'identity'
+        for candidate in ('br', 'gzip', 'deflate'):
+            if candidate in self.encodings and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+
+        headers = {'ETag': f'"{self.etag_for(encoding)}"', 'Vary': 'Accept-Encoding'}
+        if self.last_modified is not None:
+            headers['Last-Modified'] = http_date(self.last_modified)
+
+        if self._not_modified(request):
+            return Response(status=304, headers=headers)
+
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+
+        return Response(self.encodings[encoding], status=200, headers=headers, content_type=self.content_type)
@@ -1,32 +1,31 @@
+import json
+
+from app.utils.aho_corasick import AhoCorasick
+from config.settings import settings
+
 
 class ImageSearcher:
+    '''根据问题中出现的关键词返回配图
 
-    def __init__(self):
-        self.image_pair = {
-            "江南大学": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411102806.png",
-            "军舰": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411102751.png",
-            "消防手套": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411101854.png",
-            "灭火剂": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411104044.png",
-            "灭火": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411102650.png",
-            "潜水装具": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411102343.png",
-            "消防水枪": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411102528.png",
-            "潜水": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411104255.png",
-            "消防呼吸器": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411103758.png",
-            "损管尺": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411104425.png",
-            "喷射泵": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411104459.png",
-            "空气泡沫喷漆": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411104707.png",
-            "火灾": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411214012.png",
-            "潜水员": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411214038.png",
-            "测深仪": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411214124.png",
-            "舰艇声呐": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411214203.png",
-            "潜水呼吸装置": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411214221.png",
-            "舰艇发动机": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411214326.png",
-            "鲨鱼": "https://xerrors.oss-cn-shanghai.aliyuncs.com/imgs/20230411214352.png",
-        }
+    图片目录（关键词 -> 图片链接）从 JSON 文件加载并编译成 Aho-Corasick 自动机，
+    一次线性扫描找出问题中出现的所有关键词，取最长（最具体）的一个，查询耗时与目录大小无关。
+    '''
 
-    def search(self, query):
+    def __init__(self, path=None):
+        self.path = path or settings.IMAGE_CATALOG_PATH
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.image_pair = json.load(f)
+
+        self.automaton = AhoCorasick()
         for key, value in self.image_pair.items():
-            if key in query:
-                return value
+            self.automaton.add(key, value)
+        self.automaton.build()
+
+    def search(self, query):
+        best = None
+        for start, end, value in self.automaton.iter(query):
+            # 最长优先，长度相同时取先出现的
+            if best is None or end - start > best[1] - best[0]:
+                best = (start, end, value)
 
-        return None
+        return best[2] if best else None
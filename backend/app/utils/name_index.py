@@ -0,0 +1,59 @@
+from app.utils.aho_corasick import AhoCorasick
+
+
+class NameIndex:
+    '''节点名称的倒排索引，支持两个方向的模糊匹配
+
+    - contained_in(query)：名称出现在 query 中的节点，用 Aho-Corasick 自动机一次扫描 query 得到；
+    - containing(query)：名称中包含 query 的节点，用字符 bigram 倒排表取最短的候选列表再逐个校验。
+    两者的并集与原来的 `name in query or query in name` 判断完全一致。
+    '''
+
+    def __init__(self, names):
+        self.names = names
+
+        self.automaton = AhoCorasick()
+        self.empty_names = []   # 空名称被任何 query 包含
+        for idx, name in enumerate(names):
+            if name:
+                self.automaton.add(name, idx)
+            else:
+                self.empty_names.append(idx)
+        self.automaton.build()
+
+        # 单字和 bigram 倒排表，列表中的节点 id 升序且不重复
+        self.postings = {}
+        for idx, name in enumerate(names):
+            grams = set(name)
+            grams.update(name[i:i + 2] for i in range(len(name) - 1))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(idx)
+
+    def contained_in(self, query):
+        '''名称是 query 子串的节点 id 集合'''
+        ids = set(self.empty_names)
+        for _, _, idx in self.automaton.iter(query):
+            ids.add(idx)
+        return ids
+
+    def containing(self, query):
+        '''名称包含 query 的节点 id 集合'''
+        if not query:
+            return set(range(len(self.names)))
+
+        if len(query) == 1:
+            return set(self.postings.get(query, []))
+
+        candidates = None
+        for i in range(len(query) - 1):
+            posting = self.postings.get(query[i:i + 2])
+            if not posting:
+                return set()
+            if candidates is None or len(posting) < len(candidates):
+                candidates = posting
+
+        return {idx for idx in candidates if query in self.names[idx]}
+
+    def match(self, query):
+        '''满足 `name in query or query in name` 的节点 id，升序返回'''
+        return sorted(self.contained_in(query) | self.containing(query))
@@ -1,28 +1,106 @@
 
 from paddlenlp import Taskflow
 
+from app.utils.cache import LRUCache, SqliteStore
+from config.settings import settings
+
+
+def normalize_text(text):
+    '''缓存键使用的规范化文本：去掉首尾空白并合并连续空白'''
+    return " ".join(text.split())
+
+
 class Ner:
-    def __init__(self):
-        self.model = Taskflow("ner", task_path="weights/model_41_100")
+    def __init__(self, task_path="weights/model_41_100"):
+        self.task_path = task_path
+        self.model = Taskflow("ner", task_path=task_path)
+
+        # 内存 LRU 缓存 + 可选的 SQLite 持久化缓存，键为 模型路径 + 规范化文本
+        self.cache = LRUCache(settings.NER_CACHE_SIZE)
+        self.disk_cache = SqliteStore(settings.NER_CACHE_PATH, settings.NER_CACHE_DISK_MAX) if settings.NER_CACHE_PATH else None
+
+    def _cache_key(self, text):
+        return f"{self.task_path}\x00{text}"
+
+    def _cache_get(self, text):
+        key = self._cache_key(text)
+        result = self.cache.get(key)
+        if result is None and self.disk_cache is not None:
+            result = self.disk_cache.get(key)
+            if result is not None:
+                result = [tuple(item) for item in result]
+                self.cache.put(key, result)
+        return result
+
+    def _cache_put(self, text, result):
+        key = self._cache_key(text)
+        self.cache.put(key, result)
+        if self.disk_cache is not None:
+            self.disk_cache.put(key, result)
+
+    def cache_stats(self):
+        return {
+            "memory": self.cache.stats(),
+            "disk": self.disk_cache.stats() if self.disk_cache is not None else None,
+        }
 
     def predict(self, text):
-        return self.model(text)
+        '''识别结果会被缓存，相同（规范化后）的文本不再调用模型'''
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, texts):
+        '''一次调用模型得到多条文本的识别结果，返回与 texts 等长的列表，只有未命中缓存的文本会送入模型'''
+        texts = [normalize_text(text) for text in texts]
+        results = [self._cache_get(text) for text in texts]
+
+        missing = list(dict.fromkeys(text for text, result in zip(texts, results) if result is None))
+        if missing:
+            outputs = self.model(missing)
+            # 只有一条输入时 Taskflow 直接返回 [(词, 类型), ...]，统一包一层
+            if len(missing) == 1 and (not outputs or isinstance(outputs[0][0], str)):
+                outputs = [outputs]
+
+            computed = {}
+            for text, output in zip(missing, outputs):
+                computed[text] = [tuple(item) for item in output]
+                self._cache_put(text, computed[text])
+            results = [computed[text] if result is None else result for text, result in zip(texts, results)]
+
+        return results
+
+    @staticmethod
+    def filter_entities(result, etypes=None):
+        '''从一条识别结果中按 etypes 的顺序挑出指定类型的实体'''
+        if etypes is None:
+            etypes = [None]
+
+        entities = []
+        for etype in etypes:
+            for ent, et in result:
+                if not etype or etype in et:
+                    entities.append(ent)
+        return entities
 
     def get_entities(self, text, etypes=None):
         '''获取句子中指定类型的实体
 
+        模型只推理一次，再按各个类型过滤。
+
         Args:
             text: 句子
             etype: 实体类型
         Returns:
             entities: 实体列表
         '''
-        if etypes is None:
-            etypes = [None]
+        return self.filter_entities(self.predict(text), etypes)
 
-        entities = []
-        for etype in etypes:
-            for ent, et in self.predict(text):
-                if not etype or etype in et:
-                    entities.append(ent)
-        return entities
\ No newline at end of file
+    def get_entities_batch(self, texts, etypes=None):
+        '''批量获取多条句子中指定类型的实体，所有句子共用一次模型调用
+
+        Args:
+            texts: 句子列表
+            etypes: 实体类型
+        Returns:
+            entities: 与 texts 等长的实体列表
+        '''
+        return [self.filter_entities(result, etypes) for result in self.predict_batch(texts)]
@@ -0,0 +1,71 @@
+import inspect
+
+# 启动时用于校验缓存前缀与完整计算结果一致的问题
+PROBE_QUERY = "你好"
+
+
+def _last(stream):
+    item = None
+    for item in stream:
+        pass
+    return item
+
+
+class PrefixCache:
+    '''固定前缀（系统提示 init_history）的 KV 缓存
+
+    启动时系统提示只计算一次，保存其 past_key_values；之后历史恰好等于系统提示的请求
+    （即每段对话的第一轮）直接从缓存的前缀状态开始，只需编码本轮问题，省去重复的 prefill。
+
+    只有 stream_chat 支持 past_key_values 的因果注意力模型（ChatGLM2 / ChatGLM3）才能复用前缀；
+    ChatGLM-6B 对上下文使用双向注意力，前缀的 KV 依赖后面的内容，无法复用。
+    因此启动时用贪心解码比较「带缓存」和「完整计算」的输出，不一致时不启用缓存。
+    '''
+
+    def __init__(self, history, past_key_values):
+        self.history = [tuple(turn) for turn in history]
+        self.past_key_values = past_key_values
+        self.hits = 0
+
+    @staticmethod
+    def supported(model):
+        return 'past_key_values' in inspect.signature(model.stream_chat).parameters
+
+    @classmethod
+    def build(cls, model, tokenizer, pre_prompt):
+        '''运行一次系统提示，返回 (init_history, cache)；模型不支持或校验不通过时 cache 为 None'''
+        if not cls.supported(model):
+            _, history = model.chat(tokenizer, pre_prompt, [])
+            print("模型不支持 past_key_values，未启用前缀 KV 缓存")
+            return history, None
+
+        _, history, past_key_values = _last(model.stream_chat(tokenizer, pre_prompt, [], return_past_key_values=True))
+        cache = cls(history, past_key_values)
+        if not cache.verify(model, tokenizer):
+            print("前缀 KV 缓存与完整计算的输出不一致，未启用")
+            return history, None
+
+        print("已启用系统提示的前缀 KV 缓存")
+        return history, cache
+
+    def matches(self, history):
+        return [tuple(turn) for turn in history] == self.history
+
+    def past(self):
+        '''每个请求拿到一份前缀状态：模型追加 KV 时用 torch.cat 生成新张量，不会改写缓存里的张量，所以复制外层即可'''
+        self.hits += 1
+        return tuple(tuple(layer) for layer in self.past_key_values)
+
+    def verify(self, model, tokenizer):
+        kwargs = {"do_sample": False, "max_new_tokens": 8}
+        expected = _last(model.stream_chat(tokenizer, PROBE_QUERY, self.history, **kwargs))[0]
+        actual = _last(model.stream_chat(tokenizer, PROBE_QUERY, self.history,
+                                         past_key_values=self.past(), **kwargs))[0]
+        self.hits = 0
+        return expected == actual
+
+    def stream_chat(self, model, tokenizer, query, history, **kwargs):
+        '''历史与系统提示一致时从缓存的前缀开始生成，否则完整计算'''
+        if self.matches(history):
+            kwargs["past_key_values"] = self.past()
+        return model.stream_chat(tokenizer, query, history, **kwargs)
@@ -0,0 +1,84 @@
+from config.settings import settings
+
+REFERENCE_TEMPLATE = "\n===参考资料===：\n{ref}；\n\n根据上面资料，用简洁且准确的话回答下面问题：\n{question}"
+
+
+def _round_text(i, query, response):
+    '''与 ChatGLM chat / stream_chat 拼接历史的格式一致，用于估算每轮历史的 token 数'''
+    return f"[Round {i}]\n问：{query}\n答：{response}\n"
+
+
+class PromptBuilder:
+    '''按 token 预算拼装 prompt
+
+    用 ChatGLM 的 tokenizer 计数（未加载模型时按字符数估算），输入总预算为 max_tokens：
+    三元组按得分顺序加入，直到用完 triples_tokens；Wikipedia 摘要截断到 wiki_tokens；
+    剩余预算留给对话历史，固定保留开头的系统提示（init_history），其余从最新一轮往前保留，最旧的先丢弃。
+    这样无论对话多长，每轮的输入长度（以及生成耗时）都有上限。
+    '''
+
+    def __init__(self, tokenizer=None, max_tokens=None, triples_tokens=None, wiki_tokens=None):
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens or settings.PROMPT_MAX_TOKENS
+        self.triples_tokens = triples_tokens or settings.PROMPT_TRIPLES_TOKENS
+        self.wiki_tokens = wiki_tokens or settings.PROMPT_WIKI_TOKENS
+
+    def count(self, text):
+        if self.tokenizer is None:
+            return len(text)
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def truncate(self, text, limit):
+        if self.count(text) <= limit:
+            return text
+        if self.tokenizer is None:
+            return text[:limit]
+        ids = self.tokenizer.encode(text, add_special_tokens=False)[:limit]
+        return self.tokenizer.decode(ids)
+
+    def select_triples(self, triples):
+        '''按顺序（得分从高到低）保留放得进预算的三元组'''
+        selected, used = [], 0
+        for t in triples:
+            cost = self.count(f"({t[0]} {t[1]} {t[2]})；")
+            if used + cost > self.triples_tokens:
+                break
+            selected.append(t)
+            used += cost
+        return selected
+
+    def select_history(self, history, budget, pinned=()):
+        '''保留开头的 pinned 轮次，其余从最新一轮往前加入，放不下时丢弃更旧的轮次'''
+        history = [tuple(turn) for turn in history]
+        pinned = [tuple(turn) for turn in pinned]
+        if pinned and history[:len(pinned)] == pinned:
+            history = history[len(pinned):]
+            budget -= sum(self.count(_round_text(i, q, r)) for i, (q, r) in enumerate(pinned))
+        else:
+            pinned = []
+
+        kept = []
+        for i in range(len(history) - 1, -1, -1):
+            query, response = history[i]
+            cost = self.count(_round_text(len(pinned) + i, query, response))
+            if cost > budget:
+                break
+            kept.append((query, response))
+            budget -= cost
+        return pinned + kept[::-1]
+
+    def build(self, question, triples, summary, history, pinned=()):
+        '''返回 (chat_input, history, triples, summary)，后三者为实际放入 prompt 的部分'''
+        triples = self.select_triples(triples)
+        summary = self.truncate(summary, self.wiki_tokens) if summary else summary
+
+        ref = ""
+        triples_str = "".join(f"({t[0]} {t[1]} {t[2]})；" for t in triples)
+        if triples_str:
+            ref += f"三元组信息：{triples_str}；"
+        if summary:
+            ref += summary
+
+        chat_input = REFERENCE_TEMPLATE.format(ref=ref, question=question) if ref else question
+        history = self.select_history(history, self.max_tokens - self.count(chat_input), pinned)
+        return chat_input, history, triples, summary
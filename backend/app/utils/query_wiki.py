@@ -2,27 +2,45 @@ import wikipediaapi
 
 from opencc import OpenCC
 
+from app.utils.cache import SqliteStore, TTLCache
+from app.utils.wiki_store import WikiPage
+from config.settings import settings
+
 cc = OpenCC('s2t')
 
 class WikiSearcher(object):
 
     def __init__(self) -> None:
-        self.wiki = wikipediaapi.Wikipedia(user_agent='KnowledgeGraph-RAG/1.0', language='zh')
+        # 单次 HTTP 请求的超时不超过检索截止时间，超时后的请求不会长时间占用网络检索线程
+        self.wiki = wikipediaapi.Wikipedia(user_agent='KnowledgeGraph-RAG/1.0', language='zh',
+                                           timeout=settings.RETRIEVAL_WIKI_TIMEOUT)
+
+        # 存在的词条和不存在的词条分别缓存，并发请求同一个词条只发一次请求；可选 SQLite 持久化
+        store = SqliteStore(settings.WIKI_CACHE_PATH, settings.WIKI_CACHE_DISK_MAX) if settings.WIKI_CACHE_PATH else None
+        self.cache = TTLCache(settings.WIKI_CACHE_SIZE, settings.WIKI_CACHE_TTL, settings.WIKI_CACHE_NEGATIVE_TTL, store)
+
+    def _fetch(self, query):
+        '''请求词条并取出摘要，返回 [title, summary]，词条不存在时返回 None；网络错误直接抛出，不会被缓存'''
+        page = self.wiki.page(query)
+
+        if not page.exists():
+            page = self.wiki.page(cc.convert(query))
+
+        if page.exists():
+            return [page.title, page.summary]
+        return None
 
     def search(self, query):
 
         result = None
 
         try:
-            page = self.wiki.page(query)
-
-            if not page.exists():
-                page = self.wiki.page(cc.convert(query))
+            page = self.cache.get_or_load(query, self._fetch)
 
-            if page.exists():
-                result = page
+            if page is not None:
+                result = WikiPage(*page)
 
         except Exception as e:
             print(e)
 
-        return result
\ No newline at end of file
+        return result
@@ -0,0 +1,96 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from config.settings import settings
+
+# 所有请求共用的检索线程池，线程数有上限
+executor = ThreadPoolExecutor(max_workers=settings.RETRIEVAL_WORKERS, thread_name_prefix='retrieval')
+
+# 网络检索（在线 Wikipedia）单独使用一个有上限的线程池：超过截止时间仍在执行的请求无法中断，
+# 如果和本地检索共用线程池，Wikipedia 变慢时会占满线程，导致图谱、图片检索排队到超时被丢弃
+network_executor = ThreadPoolExecutor(max_workers=settings.RETRIEVAL_NETWORK_WORKERS, thread_name_prefix='retrieval-net')
+
+
+class RetrievalStage:
+    '''一次请求中的并发检索
+
+    submit() 把各个检索源丢进线程池并记录各自的截止时间（从提交时刻算起），
+    result() 最多等到该检索源的截止时间，超时或出错时返回默认值，不再阻塞后续流程。
+
+    Example:
+        stage = RetrievalStage()
+        stage.submit('image', 0.5, image_searcher.search, user_input)
+        stage.submit('graph', 1.0, graph_context, user_input)
+        image = stage.result('image')
+        graph = stage.result('graph')
+
+    submit_first_hit() 把多个候选同时提交，result() 按候选的优先级顺序返回第一个非 None 的结果：
+    更高优先级的候选都落空后立即返回，不必等低优先级的查询结束，剩下的查询随即取消；
+    截止时间到了仍未等到结果时，退而返回已经完成的低优先级候选的结果。
+    候选查询（Wikipedia）在 network_pool 中执行，不占用本地检索的线程。
+    '''
+
+    def __init__(self, pool=None, network_pool=None):
+        self.pool = pool or executor
+        self.network_pool = network_pool or network_executor
+        self.futures = {}
+        self.probes = {}
+
+    def submit(self, name, timeout, fn, *args, **kwargs):
+        future = self.pool.submit(fn, *args, **kwargs)
+        self.futures[name] = (future, time.monotonic() + timeout)
+        return future
+
+    def submit_first_hit(self, name, timeout, fn, candidates, limit=None):
+        '''limit 限制同时查询的候选数（按优先级保留前 limit 个），避免一次请求占满网络线程池'''
+        candidates = list(dict.fromkeys(candidates))[:limit]
+        futures = [self.network_pool.submit(fn, candidate) for candidate in candidates]
+        self.probes[name] = (futures, time.monotonic() + timeout)
+        return futures
+
+    def _first_hit(self, name, default):
+        futures, deadline = self.probes[name]
+        try:
+            for i, future in enumerate(futures):
+                try:
+                    result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except TimeoutError:
+                    print(f"检索超时，已跳过: {name}")
+                    return self._completed_hit(futures[i + 1:], default)
+                except Exception as e:
+                    print(f"检索失败，已跳过候选: {name}: {e}")
+                    continue
+                if result is not None:
+                    return result
+            return default
+        finally:
+            # 还在排队的候选直接取消；已在执行的无法中断，结束后结果丢弃（在线查询仍会写入缓存）
+            for future in futures:
+                future.cancel()
+
+    @staticmethod
+    def _completed_hit(futures, default):
+        '''高优先级候选超时后，返回已经完成的候选中优先级最高的非 None 结果'''
+        for future in futures:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                result = future.result()
+                if result is not None:
+                    return result
+        return default
+
+    def result(self, name, default=None):
+        '''未提交的检索源（如组件尚未加载）直接返回默认值'''
+        if name in self.probes:
+            return self._first_hit(name, default)
+        if name not in self.futures:
+            return default
+
+        future, deadline = self.futures[name]
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except TimeoutError:
+            future.cancel()
+            print(f"检索超时，已跳过: {name}")
+        except Exception as e:
+            print(f"检索失败，已跳过: {name}: {e}")
+        return default
@@ -0,0 +1,208 @@
+import queue
+import threading
+
+
+class QueueFull(Exception):
+    '''等待中的请求数已达上限'''
+
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+class _Sequence:
+    '''一个生成请求：worker 线程推进 state，结果经 outputs 队列交给请求线程
+
+    state 是批量解码器返回的序列状态，或（回退模式下）stream_fn 返回的生成器；序列结束后置为 None。
+    '''
+
+    def __init__(self, args, kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        self.state = None
+        self.outputs = queue.Queue()
+        self.cancelled = False
+
+
+class BatchDecoder:
+    '''批量解码接口：GenerationScheduler 每个解码步对所有活跃序列只调用一次 step()
+
+    start(*args, **kwargs) 为一个请求做 prefill（单独前向），返回 (state, output, finished)：
+        state 为该序列的状态，包含它自己的 KV 缓存；output 为第一步的结果。
+    step(states) 把所有序列的当前 token 和各自的 KV 缓存左填充拼成一个批次，只做一次前向，
+        返回与 states 一一对应的 (output, finished) 列表，finished 为 True 的序列随后退出批次。
+    output 原样交给请求线程（如 stream_chat 产出的 (response, history)）。
+    '''
+
+    def start(self, *args, **kwargs):
+        raise NotImplementedError
+
+    def step(self, states):
+        raise NotImplementedError
+
+
+class _Results:
+    '''submit() 返回的结果迭代器
+
+    close() 或迭代器被回收时取消序列，worker 在下一步把它移出活跃序列（尚未开始的直接跳过）。
+    与生成器不同，还没开始迭代就被关闭同样会取消，客户端在收到第一帧前断开时不会继续生成。
+    '''
+
+    def __init__(self, seq):
+        self.seq = seq
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.seq.cancelled:
+            raise StopIteration
+        item = self.seq.outputs.get()
+        if item is _DONE:
+            self.close()
+            raise StopIteration
+        if isinstance(item, _Failure):
+            self.close()
+            raise item.error
+        return item
+
+    def close(self):
+        self.seq.cancelled = True
+
+    def __del__(self):
+        self.close()
+
+
+class GenerationScheduler:
+    '''生成请求调度器：单一 worker 线程对活跃序列做批量解码，排队已满时拒绝新请求
+
+    所有请求都交给同一个 worker 线程执行，模型不再被多个 Flask 线程同时调用。
+    worker 最多同时持有 max_active 个活跃序列：新请求在步与步之间加入（先单独 prefill），
+    每个解码步用 decoder.step() 对所有活跃序列做一次批量前向，序列结束即退出批次并从队列补入新请求
+    （continuous batching），各请求线程从自己的迭代器中按步取回结果。
+    等待中的请求超过 max_queue 时 submit() 抛出 QueueFull，由接口返回 429。
+
+    没有批量前向的模型（decoder 为 None）回退为按步轮流推进：stream_fn(*args, **kwargs) 返回逐步产出结果的生成器
+    （如 model.stream_chat），每步对每个序列各调用一次 next()，每个序列单独前向，吞吐与逐个生成相同。
+
+    Example:
+        scheduler = GenerationScheduler(decoder=HFBatchDecoder.build(model, tokenizer), max_active=4, max_queue=16)
+        for response, history in scheduler.submit(query, history):
+            ...
+    '''
+
+    def __init__(self, stream_fn=None, max_active=4, max_queue=16, decoder=None):
+        self.stream_fn = stream_fn
+        self.decoder = decoder
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.active = []
+        self.steps = 0
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def full(self):
+        return self._pending.qsize() >= self.max_queue
+
+    def stats(self):
+        return {'active': len(self.active), 'pending': self._pending.qsize(), 'steps': self.steps,
+                'batched': self.decoder is not None, 'max_active': self.max_active, 'max_queue': self.max_queue}
+
+    def submit(self, *args, **kwargs):
+        '''提交一个生成请求，返回逐步产出结果的迭代器；队列已满时抛出 QueueFull'''
+        seq = _Sequence(args, kwargs)
+        with self._lock:
+            if self.full():
+                raise QueueFull(f"too many pending requests ({self.max_queue})")
+            self._pending.put(seq)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='generation', daemon=True)
+                self._worker.start()
+        return _Results(seq)
+
+    def _admit(self, seq):
+        if seq.cancelled:
+            return
+        try:
+            if self.decoder is None:
+                seq.state = self.stream_fn(*seq.args, **seq.kwargs)
+            else:
+                state, output, finished = self.decoder.start(*seq.args, **seq.kwargs)
+                seq.outputs.put(output)
+                if finished:
+                    seq.outputs.put(_DONE)
+                    return
+                seq.state = state
+        except Exception as e:
+            seq.outputs.put(_Failure(e))
+            return
+        self.active.append(seq)
+
+    def _run(self):
+        while True:
+            # 没有活跃序列时阻塞等待，否则只取已在排队的请求，不耽误活跃序列
+            if not self.active:
+                self._admit(self._pending.get())
+            while len(self.active) < self.max_active:
+                try:
+                    self._admit(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            if self.active:
+                self.step(self.active)
+                self.steps += 1
+                self.active = [seq for seq in self.active if seq.state is not None]
+
+    def step(self, sequences):
+        '''推进每个序列一个解码步；结束、出错或已取消的序列把 state 置为 None'''
+        if self.decoder is None:
+            self._step_each(sequences)
+        else:
+            self._step_batch(sequences)
+
+    def _step_batch(self, sequences):
+        '''所有未取消的序列合成一个批次，只做一次前向'''
+        batch = []
+        for seq in sequences:
+            if seq.cancelled:
+                seq.state = None
+            else:
+                batch.append(seq)
+        if not batch:
+            return
+
+        try:
+            results = self.decoder.step([seq.state for seq in batch])
+        except Exception as e:
+            for seq in batch:
+                seq.outputs.put(_Failure(e))
+                seq.state = None
+            return
+
+        for seq, (output, finished) in zip(batch, results):
+            seq.outputs.put(output)
+            if finished:
+                seq.outputs.put(_DONE)
+                seq.state = None
+
+    def _step_each(self, sequences):
+        '''回退模式：轮流对每个序列的生成器调用一次 next()'''
+        for seq in sequences:
+            if seq.cancelled:
+                seq.state.close()
+                seq.state = None
+                continue
+            try:
+                seq.outputs.put(next(seq.state))
+            except StopIteration:
+                seq.outputs.put(_DONE)
+                seq.state = None
+            except Exception as e:
+                seq.outputs.put(_Failure(e))
+                seq.state = None
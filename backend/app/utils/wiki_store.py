@@ -0,0 +1,44 @@
+import sqlite3
+import threading
+from collections import namedtuple
+
+from opencc import OpenCC
+
+# 简繁统一为简体，须与 utils/build_wiki_store.py 中的 normalize_title 保持一致
+cc = OpenCC('t2s')
+
+# 与 wikipediaapi 的 WikipediaPage 一样提供 title / summary，调用方无需区分在线或离线
+WikiPage = namedtuple('WikiPage', ['title', 'summary'])
+
+
+def normalize_title(title):
+    '''标题索引键：繁体转简体、去掉空白和下划线、统一小写'''
+    return "".join(cc.convert(title).replace("_", " ").split()).lower()
+
+
+class WikiStore(object):
+    '''离线 Wikipedia 摘要库
+
+    由 utils/build_wiki_store.py 从 dump 构建的 SQLite 文件，标题和重定向都已规范化（简繁统一），
+    一次主键查找即可得到词条，查询不依赖网络。接口与 WikiSearcher 相同。
+    '''
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+
+    def search(self, query):
+        key = normalize_title(query)
+        if not key:
+            return None
+
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT p.title, p.summary FROM ('
+                '  SELECT page_id, 0 AS redirect FROM titles WHERE key = ?'
+                '  UNION ALL SELECT page_id, 1 AS redirect FROM redirects WHERE key = ?'
+                ') m JOIN pages p ON p.id = m.page_id ORDER BY m.redirect LIMIT 1',
+                (key, key)).fetchone()
+
+        return WikiPage(*row) if row else None
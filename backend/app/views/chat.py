@@ -1,8 +1,10 @@
 import os
 import json
-from flask import Response, request, Blueprint
+from itertools import chain
+from flask import Response, request, Blueprint, jsonify
 
-from app.utils.chat_glm import stream_predict
+from app.utils.chat_glm import scheduler, stream_predict
+from app.utils.scheduler import QueueFull
 
 mod = Blueprint('chat', __name__, url_prefix='/chat')
 
@@ -17,5 +19,25 @@ def chat():
     request_data = json.loads(request.data)
     prompt = request_data['prompt']
     history = request_data['history']
+    # protocol=2 为增量流式协议（见 stream_predict），默认仍为每步返回完整 JSON
+    protocol = request_data.get('protocol', 1)
 
-    return Response(response=stream_predict(prompt, history=history), content_type='application/json', status=200)
+    # 生成排队已满时直接返回 429，不再做检索
+    if scheduler.full():
+        return _busy()
+
+    # 先取出第一帧：检索完成后才提交生成请求，此时排队已满同样返回 429
+    stream = stream_predict(prompt, history=history, protocol=protocol)
+    try:
+        first = next(stream)
+    except QueueFull:
+        return _busy()
+
+    response = Response(response=chain([first], stream), content_type='application/json', status=200)
+    # chain 没有 close()，客户端断开时由这里关闭 stream_predict，取消还在排队或生成中的请求
+    response.call_on_close(stream.close)
+    return response
+
+
+def _busy():
+    return jsonify({"message": "服务繁忙，请稍后再试"}), 429, {"Retry-After": "1"}
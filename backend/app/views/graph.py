@@ -1,16 +1,88 @@
 import os
 import json
-from flask import request, Blueprint, jsonify
+import threading
+from flask import request, Blueprint, jsonify, abort
 from thefuzz import process
 
+from app.utils.graph_store import graph_store
+from app.utils.http_cache import PrecompressedPayload
+from config.settings import settings
+
 
 mod = Blueprint('graph', __name__, url_prefix='/graph')
 
 
+# 完整图谱的响应体按图谱版本缓存：(version, PrecompressedPayload)
+_graph_payload = (None, None)
+_graph_payload_lock = threading.Lock()
+
+
 @mod.route('/', methods=['GET'])
 def graph():
-    with open('data/data.json', 'r') as f:
-        data = json.load(f)
+    global _graph_payload
+
+    # 图谱文件变化时 refresh() 会加载新版本，缓存随之失效
+    graph = graph_store.refresh()
+    version, payload = _graph_payload
+    if version != graph.version:
+        with _graph_payload_lock:
+            version, payload = _graph_payload
+            if version != graph.version:
+                body = json.dumps({
+                    'data': graph.to_dict(),
+                    'message': 'You Got It!'
+                }, ensure_ascii=False).encode('utf8')
+                payload = PrecompressedPayload(body, last_modified=graph.mtime)
+                _graph_payload = (graph.version, payload)
+
+    return payload.respond(request)
+
+
+def _arg_limit(default, upper):
+    '''读取 limit 参数并限制在 [1, upper] 之间'''
+    try:
+        limit = int(request.args.get('limit', default))
+    except ValueError:
+        limit = default
+    return max(1, min(limit, upper))
+
+
+def _subgraph(graph, node_ids):
+    '''节点及其诱导边，边的 source / target 为原图中的节点 id'''
+    return {
+        'nodes': [graph.node(idx) for idx in node_ids],
+        'links': [graph.link(edge_id) for edge_id in graph.induced_edges(node_ids, settings.GRAPH_API_MAX_EDGES)],
+    }
+
+
+@mod.route('/top', methods=['GET'])
+def graph_top():
+    '''按重要度返回前 limit 个节点及它们之间的边'''
+    graph = graph_store.refresh()
+    limit = _arg_limit(200, settings.GRAPH_API_MAX_NODES)
+
+    data = _subgraph(graph, graph.top_nodes(limit))
+    data['total_nodes'] = graph.num_nodes
+    data['total_links'] = graph.num_links
+
+    return jsonify({
+        'data': data,
+        'message': 'You Got It!'
+    })
+
+
+@mod.route('/expand/<int:node_id>', methods=['GET'])
+def graph_expand(node_id):
+    '''展开一个节点：返回它和重要度最高的 limit 个相邻节点、它们之间的边，以及该节点出现过的句子（最多 GRAPH_API_MAX_SENTS 句）'''
+    graph = graph_store.refresh()
+    if not 0 <= node_id < graph.num_nodes:
+        abort(404)
+    limit = _arg_limit(50, settings.GRAPH_API_MAX_NODES)
+
+    data = _subgraph(graph, [node_id] + graph.neighbors(node_id, limit))
+    lines = data['nodes'][0]['lines']
+    data['sents'] = {idx: graph.sents[idx] for idx in lines[:settings.GRAPH_API_MAX_SENTS]}
+    data['total_sents'] = len(lines)
 
     return jsonify({
         'data': data,
@@ -18,6 +90,33 @@ def graph():
     })
 
 
+@mod.route('/search', methods=['GET'])
+def graph_search():
+    '''按名称前缀搜索节点'''
+    graph = graph_store.refresh()
+    prefix = request.args.get('prefix', '')
+    limit = _arg_limit(20, settings.GRAPH_API_MAX_NODES)
+
+    node_ids = graph.prefix_search(prefix, limit) if prefix else []
+
+    return jsonify({
+        'data': {'nodes': [graph.node(idx) for idx in node_ids]},
+        'message': 'You Got It!'
+    })
+
+
+@mod.route('/reload', methods=['POST'])
+def reload_graph():
+    graph = graph_store.reload()
+
+    return jsonify({
+        'version': graph.version,
+        'nodes': graph.num_nodes,
+        'links': graph.num_links,
+        'message': 'Reloaded!'
+    })
+
+
 # @mod.route('/search', methods=['GET'])
 # def get_triples():
 #     # 获取参数
@@ -14,12 +14,13 @@ load_dotenv()
 settings.setup_cuda()
 
 from app import apps
-from app.utils.chat_glm import start_model
+from app.utils.components import components
 
 
 if __name__ == '__main__':
-    print("Starting model...")
-    start_model()
+    # 模型、NER、图谱等组件在后台并行加载，服务立即开始接受请求，加载进度见 GET /ready
+    print("Starting components...")
+    components.start()
     apps.secret_key = settings.SECRET_KEY.encode() if isinstance(settings.SECRET_KEY, str) else settings.SECRET_KEY
     apps.run(host=settings.SERVER_HOST, port=settings.SERVER_PORT, debug=settings.DEBUG, threaded=True)
 
@@ -10,7 +10,7 @@ Usage:
 import os
 from pathlib import Path
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import List, Optional
 
 
 def _get_project_root() -> Path:
@@ -68,6 +68,18 @@ class Settings:
         custom = _get_env("RAW_DATA_PATH")
         return Path(custom) if custom else self.DATA_DIR / "raw_data" / "raw_data.txt"
 
+    @property
+    def GRAPH_DATA_PATH(self) -> Path:
+        """Knowledge graph file (data.json) served by the backend."""
+        custom = _get_env("GRAPH_DATA_PATH")
+        return Path(custom) if custom else self.PROJECT_ROOT / "backend" / "data" / "data.json"
+
+    @property
+    def IMAGE_CATALOG_PATH(self) -> Path:
+        """Keyword -> image URL catalog (images.json) used by the image searcher."""
+        custom = _get_env("IMAGE_CATALOG_PATH")
+        return Path(custom) if custom else self.PROJECT_ROOT / "backend" / "data" / "images.json"
+
     # ============== Model Configuration ==============
     @property
     def CHATGLM_MODEL_PATH(self) -> str:
@@ -96,6 +108,36 @@ class Settings:
             return _get_env("UIE_MODEL_NAME", default_path)
         return _get_env("UIE_MODEL_NAME", "uie-base")
 
+    @property
+    def CPU_QUANTIZE(self) -> bool:
+        """Apply dynamic int8 quantization to the chat model's linear layers when running on CPU."""
+        return _get_env_bool("CPU_QUANTIZE", False)
+
+    @property
+    def CPU_QUANT_CACHE_PATH(self) -> str:
+        """File caching the quantized chat model so later CPU startups skip the conversion (empty disables it)."""
+        return _get_env("CPU_QUANT_CACHE_PATH", "")
+
+    @property
+    def PREFIX_CACHE_ENABLED(self) -> bool:
+        """Reuse the system preamble's KV cache when the model supports it."""
+        return _get_env_bool("PREFIX_CACHE_ENABLED", True)
+
+    @property
+    def GENERATION_MAX_ACTIVE(self) -> int:
+        """Maximum number of sequences decoded together in one batch (or interleaved step by step in the fallback)."""
+        return _get_env_int("GENERATION_MAX_ACTIVE", 4)
+
+    @property
+    def GENERATION_BATCHED(self) -> bool:
+        """Decode active sequences in one batched forward per step, if the model passes the startup check."""
+        return _get_env_bool("GENERATION_BATCHED", True)
+
+    @property
+    def GENERATION_MAX_QUEUE(self) -> int:
+        """Maximum number of waiting generation requests before /chat answers 429."""
+        return _get_env_int("GENERATION_MAX_QUEUE", 16)
+
     # ============== Training Configuration ==============
     @property
     def TRAIN_RATIO(self) -> float:
@@ -179,6 +221,179 @@ class Settings:
         """Debug mode flag."""
         return _get_env_bool("DEBUG", False)
 
+    # ============== Graph Retrieval Configuration ==============
+    @property
+    def GRAPH_SEARCH_DEPTH(self) -> int:
+        """Number of hops expanded around matched nodes when building the lite graph."""
+        return _get_env_int("GRAPH_SEARCH_DEPTH", 1)
+
+    @property
+    def GRAPH_HOP_FANOUT(self) -> List[int]:
+        """Per-hop cap on edges taken from each frontier node (comma separated, 0 = unlimited)."""
+        value = _get_env("GRAPH_HOP_FANOUT")
+        try:
+            return [int(v) for v in value.split(",") if v.strip()]
+        except ValueError:
+            return []
+
+    @property
+    def GRAPH_MAX_EDGES(self) -> int:
+        """Cap on the total number of edges in the lite graph (0 = unlimited)."""
+        return _get_env_int("GRAPH_MAX_EDGES", 0)
+
+    @property
+    def GRAPH_API_MAX_NODES(self) -> int:
+        """Maximum number of nodes returned by one paginated /graph/ request."""
+        return _get_env_int("GRAPH_API_MAX_NODES", 500)
+
+    @property
+    def GRAPH_API_MAX_EDGES(self) -> int:
+        """Maximum number of edges returned by one paginated /graph/ request."""
+        return _get_env_int("GRAPH_API_MAX_EDGES", 2000)
+
+    @property
+    def GRAPH_API_MAX_SENTS(self) -> int:
+        """Maximum number of sentences /graph/expand returns for the expanded node."""
+        return _get_env_int("GRAPH_API_MAX_SENTS", 20)
+
+    # ============== Retrieval Configuration ==============
+    @property
+    def RETRIEVAL_WORKERS(self) -> int:
+        """Size of the thread pool shared by all retrieval sources."""
+        return _get_env_int("RETRIEVAL_WORKERS", 8)
+
+    @property
+    def RETRIEVAL_NETWORK_WORKERS(self) -> int:
+        """Size of the separate thread pool for network lookups (online Wikipedia)."""
+        return _get_env_int("RETRIEVAL_NETWORK_WORKERS", 4)
+
+    @property
+    def RETRIEVAL_NER_TIMEOUT(self) -> float:
+        """Deadline (seconds) for entity extraction."""
+        return _get_env_float("RETRIEVAL_NER_TIMEOUT", 3.0)
+
+    @property
+    def RETRIEVAL_GRAPH_TIMEOUT(self) -> float:
+        """Deadline (seconds) for the knowledge graph lookup."""
+        return _get_env_float("RETRIEVAL_GRAPH_TIMEOUT", 1.0)
+
+    @property
+    def RETRIEVAL_IMAGE_TIMEOUT(self) -> float:
+        """Deadline (seconds) for the image lookup."""
+        return _get_env_float("RETRIEVAL_IMAGE_TIMEOUT", 0.5)
+
+    @property
+    def RETRIEVAL_WIKI_TIMEOUT(self) -> float:
+        """Deadline (seconds) for the Wikipedia lookup."""
+        return _get_env_float("RETRIEVAL_WIKI_TIMEOUT", 3.0)
+
+    @property
+    def RETRIEVAL_WIKI_MAX_CANDIDATES(self) -> int:
+        """Maximum number of Wikipedia lookups (entities, then the question) issued per request."""
+        return _get_env_int("RETRIEVAL_WIKI_MAX_CANDIDATES", 3)
+
+    @property
+    def WIKI_MODE(self) -> str:
+        """Wikipedia source: "online" (wikipediaapi) or "offline" (local SQLite store)."""
+        return _get_env("WIKI_MODE", "online").lower()
+
+    @property
+    def WIKI_STORE_PATH(self) -> Path:
+        """SQLite summary store built by utils/build_wiki_store.py, used in offline mode."""
+        custom = _get_env("WIKI_STORE_PATH")
+        return Path(custom) if custom else self.PROJECT_ROOT / "backend" / "data" / "wiki.sqlite"
+
+    @property
+    def WIKI_CACHE_SIZE(self) -> int:
+        """Number of online Wikipedia lookups kept in memory (0 disables it)."""
+        return _get_env_int("WIKI_CACHE_SIZE", 4096)
+
+    @property
+    def WIKI_CACHE_TTL(self) -> float:
+        """Seconds a found Wikipedia page stays cached."""
+        return _get_env_float("WIKI_CACHE_TTL", 86400.0)
+
+    @property
+    def WIKI_CACHE_NEGATIVE_TTL(self) -> float:
+        """Seconds a missing Wikipedia page stays cached."""
+        return _get_env_float("WIKI_CACHE_NEGATIVE_TTL", 3600.0)
+
+    @property
+    def WIKI_CACHE_PATH(self) -> str:
+        """SQLite file for the persistent Wikipedia cache (empty disables it)."""
+        return _get_env("WIKI_CACHE_PATH", "")
+
+    @property
+    def WIKI_CACHE_DISK_MAX(self) -> int:
+        """Maximum number of entries kept in the persistent Wikipedia cache."""
+        return _get_env_int("WIKI_CACHE_DISK_MAX", 100000)
+
+    @property
+    def GAZETTEER_ENABLED(self) -> bool:
+        """Link entities with the graph-name gazetteer before falling back to the NER model."""
+        return _get_env_bool("GAZETTEER_ENABLED", True)
+
+    @property
+    def GAZETTEER_MIN_LENGTH(self) -> int:
+        """Shortest node name the gazetteer will link."""
+        return _get_env_int("GAZETTEER_MIN_LENGTH", 2)
+
+    @property
+    def GAZETTEER_SPECIFIC_LENGTH(self) -> int:
+        """Gazetteer hits only replace NER when at least one linked name is this long."""
+        return _get_env_int("GAZETTEER_SPECIFIC_LENGTH", 3)
+
+    @property
+    def GAZETTEER_STOPWORDS_PATH(self) -> str:
+        """Extra gazetteer stopwords, one per line (added to the built-in list)."""
+        return _get_env("GAZETTEER_STOPWORDS_PATH", "")
+
+    @property
+    def NER_CACHE_SIZE(self) -> int:
+        """Number of NER results kept in the in-memory LRU cache (0 disables it)."""
+        return _get_env_int("NER_CACHE_SIZE", 1024)
+
+    @property
+    def NER_CACHE_PATH(self) -> str:
+        """SQLite file for the persistent NER cache (empty disables it)."""
+        return _get_env("NER_CACHE_PATH", "")
+
+    @property
+    def NER_CACHE_DISK_MAX(self) -> int:
+        """Maximum number of entries kept in the persistent NER cache."""
+        return _get_env_int("NER_CACHE_DISK_MAX", 100000)
+
+    # ============== Prompt Configuration ==============
+    @property
+    def PROMPT_MAX_TOKENS(self) -> int:
+        """Token budget for the whole model input (question, references and history)."""
+        return _get_env_int("PROMPT_MAX_TOKENS", 1536)
+
+    @property
+    def PROMPT_TRIPLES_TOKENS(self) -> int:
+        """Token budget for the knowledge graph triples in the prompt."""
+        return _get_env_int("PROMPT_TRIPLES_TOKENS", 256)
+
+    @property
+    def PROMPT_WIKI_TOKENS(self) -> int:
+        """Token budget for the Wikipedia summary in the prompt."""
+        return _get_env_int("PROMPT_WIKI_TOKENS", 384)
+
+    @property
+    def ANSWER_CACHE_SIZE(self) -> int:
+        """Number of first-turn answers kept for replay (0 disables the answer cache)."""
+        return _get_env_int("ANSWER_CACHE_SIZE", 512)
+
+    @property
+    def ANSWER_CACHE_TTL(self) -> float:
+        """Seconds a cached answer stays valid."""
+        return _get_env_float("ANSWER_CACHE_TTL", 3600.0)
+
+    @property
+    def ANSWER_CACHE_SIMILARITY(self) -> float:
+        """Cosine similarity above which a different question with the same references reuses an answer (0 = exact only)."""
+        return _get_env_float("ANSWER_CACHE_SIMILARITY", 0.0)
+
     # ============== Schema Configuration ==============
     @property
     def SCHEMA_VERSION(self) -> str:
@@ -0,0 +1,94 @@
+"""
+KG 转换（utils/convert_kg_to_server_data.py 中的 build_server_graph）的测试
+节点的 lines 只和最后一个句子比较去重，结果必须与逐个检查 `sent_idx not in lines` 的原始实现完全一致
+"""
+import copy
+import importlib.util
+import random
+from pathlib import Path
+
+import pytest
+
+CONVERTER_PATH = Path(__file__).resolve().parent.parent / "utils" / "convert_kg_to_server_data.py"
+spec = importlib.util.spec_from_file_location("convert_kg_to_server_data", CONVERTER_PATH)
+converter = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(converter)
+
+build_server_graph = converter.build_server_graph
+
+
+def item(sent, *triples):
+    return {
+        "sentText": sent,
+        "relationMentions": [{"em1Text": h, "em2Text": t, "label": r} for h, t, r in triples],
+    }
+
+
+def reference_graph(items):
+    '''原始的转换逻辑：每次提及都线性扫描 lines'''
+    nodes, node_index, links, sents = [], {}, [], []
+    for it in items:
+        sent = it.get("sentText", "").strip()
+        if not sent:
+            continue
+        sent_idx = len(sents)
+        sents.append(sent)
+        for rel in it.get("relationMentions", []):
+            h = rel.get("em1Text", "").strip()
+            t = rel.get("em2Text", "").strip()
+            r = rel.get("label", "").strip()
+            if not h or not t or not r:
+                continue
+            for name in (h, t):
+                if name not in node_index:
+                    node_index[name] = len(nodes)
+                    nodes.append({"id": str(len(nodes)), "name": name, "category": 0, "draggable": True,
+                                  "value": 1, "lines": [sent_idx], "symbolSize": 20})
+                else:
+                    node = nodes[node_index[name]]
+                    if sent_idx not in node["lines"]:
+                        node["lines"].append(sent_idx)
+                    node["value"] += 1
+            links.append({"source": node_index[h], "target": node_index[t], "name": r, "sent": sent_idx})
+    return {"nodes": nodes, "links": links, "sents": sents}
+
+
+ITEMS = [
+    item("舰艇发生火灾时使用灭火剂。", ("舰艇", "火灾", "发生"), ("灭火剂", "火灾", "扑灭")),
+    item("", ("空句子", "不计入", "跳过")),
+    item("潜水员使用潜水装具。", ("潜水员", "潜水装具", "使用"), ("潜水员", "潜水员", "自环")),
+    item("损管人员检查舰艇。", ("损管人员", "舰艇", "检查"), ("", "缺少头实体", "跳过"), ("舰艇", "损管人员", "属于")),
+    item("  ", ("空白句子", "不计入", "跳过")),
+    item("潜水员佩戴呼吸器。", ("潜水员", "呼吸器", "佩戴"), ("呼吸器", "灭火剂", "无关")),
+]
+
+
+def test_matches_reference_conversion():
+    graph = build_server_graph(ITEMS)
+
+    assert graph == reference_graph(ITEMS)
+    assert graph["sents"] == ["舰艇发生火灾时使用灭火剂。", "潜水员使用潜水装具。", "损管人员检查舰艇。", "潜水员佩戴呼吸器。"]
+
+
+def test_node_appearing_twice_in_one_sentence_is_listed_once():
+    nodes = {node["name"]: node for node in build_server_graph(ITEMS)["nodes"]}
+
+    # 潜水员 在第 1 句中出现 3 次（含自环），在第 3 句中出现 1 次
+    assert nodes["潜水员"]["lines"] == [1, 3]
+    assert nodes["潜水员"]["value"] == 4
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_items_match_reference_conversion(seed):
+    rng = random.Random(seed)
+    names = [f"实体{i}" for i in range(30)] + [""]
+    labels = ["属于", "使用", "包含", "位于", ""]
+
+    items = []
+    for i in range(200):
+        triples = [(rng.choice(names), rng.choice(names), rng.choice(labels)) for _ in range(rng.randint(0, 4))]
+        items.append(item(rng.choice([f"句子{i}", "", " "]) if rng.random() < 0.1 else f"句子{i}", *triples))
+
+    assert build_server_graph(copy.deepcopy(items)) == reference_graph(items)
+    for node in build_server_graph(items)["nodes"]:
+        assert node["lines"] == sorted(set(node["lines"]))
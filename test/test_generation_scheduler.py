@@ -0,0 +1,277 @@
+"""
+生成调度器（backend/app/utils/scheduler.py）的测试
+用逐字输出的小模型代替 ChatGLM，不需要模型权重或 GPU：
+TinyBatchDecoder 测试批量解码，TinyModel（只有 stream_chat）测试没有批量前向时的轮流推进回退
+"""
+import importlib.util
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# 直接按文件加载，避免导入 app 包时加载 ChatGLM / NER 模型
+SCHEDULER_PATH = Path(__file__).resolve().parent.parent / "backend" / "app" / "utils" / "scheduler.py"
+spec = importlib.util.spec_from_file_location("scheduler", SCHEDULER_PATH)
+scheduler_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(scheduler_module)
+
+BatchDecoder = scheduler_module.BatchDecoder
+GenerationScheduler = scheduler_module.GenerationScheduler
+QueueFull = scheduler_module.QueueFull
+
+PAD = None
+
+
+class TinyBatchDecoder(BatchDecoder):
+    """批量解码的小模型：把问题倒序逐字输出
+
+    每个序列的 KV 缓存是它已处理过的 token 列表；step() 把各序列的缓存左填充 PAD 后拼成一个批次，
+    一次“前向”按掩码跳过填充位置为每一行算出下一个 token，并记录前向次数和批次大小。
+    """
+
+    def __init__(self):
+        self.forward_calls = 0
+        self.batch_sizes = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.starting = threading.Event()
+
+    def start(self, query, history):
+        self.starting.set()
+        self.gate.wait()
+        state = {"query": query, "history": history, "kv": list(query)}
+        return (state, *self._next(state, list(query)))
+
+    def step(self, states):
+        width = max(len(state["kv"]) for state in states)
+        batch = [[PAD] * (width - len(state["kv"])) + state["kv"] for state in states]
+        mask = [[token is not PAD for token in row] for row in batch]
+        self.forward_calls += 1
+        self.batch_sizes.append(len(batch))
+        return [self._next(state, [t for t, m in zip(row, row_mask) if m])
+                for state, row, row_mask in zip(states, batch, mask)]
+
+    @staticmethod
+    def _next(state, tokens):
+        query = state["query"]
+        generated = len(tokens) - len(query)
+        token = query[::-1][generated]
+        state["kv"] = tokens + [token]
+        response = "".join(state["kv"][len(query):])
+        return (response, state["history"] + [(query, response)]), len(response) == len(query)
+
+
+def test_batched_decoding_costs_one_forward_per_step():
+    decoder = TinyBatchDecoder()
+    decoder.gate.clear()
+    scheduler = GenerationScheduler(decoder=decoder, max_active=4, max_queue=4)
+
+    results = {}
+
+    def run(query):
+        results[query] = [response for response, _ in scheduler.submit(query, [])]
+
+    threads = [threading.Thread(target=run, args=(q,)) for q in ("aaaa", "bb", "cccccc")]
+    threads[0].start()
+    decoder.starting.wait(timeout=5)
+    for t in threads[1:]:
+        t.start()
+    # 第一个请求的 prefill 被挡住，等另外两个请求排队后再放行，三个序列同时进入批次
+    while scheduler.stats()["pending"] < 2:
+        time.sleep(0.01)
+    decoder.gate.set()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert results == {"aaaa": ["a", "aa", "aaa", "aaaa"], "bb": ["b", "bb"],
+                       "cccccc": ["c", "cc", "ccc", "cccc", "ccccc", "cccccc"]}
+    # 每个解码步只有一次前向，无论批次中有几个序列；结束的序列退出批次
+    assert decoder.forward_calls == scheduler.steps == 5
+    assert decoder.batch_sizes == [3, 2, 2, 1, 1]
+    assert scheduler.stats()["batched"]
+
+
+def test_batched_decoding_keeps_sequences_apart():
+    decoder = TinyBatchDecoder()
+    scheduler = GenerationScheduler(decoder=decoder, max_active=2, max_queue=8)
+
+    streams = [scheduler.submit(q, [("h", q)]) for q in ("abc", "xy", "hello", "q")]
+    finals = [list(s)[-1] for s in streams]
+
+    assert finals == [("cba", [("h", "abc"), ("abc", "cba")]), ("yx", [("h", "xy"), ("xy", "yx")]),
+                      ("olleh", [("h", "hello"), ("hello", "olleh")]), ("q", [("h", "q"), ("q", "q")])]
+    assert max(decoder.batch_sizes) == 2
+
+
+def test_cancelled_sequence_leaves_the_batch():
+    decoder = TinyBatchDecoder()
+    scheduler = GenerationScheduler(decoder=decoder, max_active=2, max_queue=2)
+    original_step = decoder.step
+
+    def step(states):
+        time.sleep(0.01)
+        return original_step(states)
+
+    decoder.step = step
+    stream = scheduler.submit("abcdefghij", [])
+    next(stream)
+    stream.close()
+
+    # 被放弃的序列退出批次（跑完需要 9 个解码步），后续请求正常完成
+    assert list(scheduler.submit("xy", []))[-1][0] == "yx"
+    assert sum(decoder.batch_sizes) < 9
+
+
+def test_batched_step_error_fails_every_sequence_in_the_batch():
+    class BrokenDecoder(TinyBatchDecoder):
+        def step(self, states):
+            raise RuntimeError("model failed")
+
+    decoder = BrokenDecoder()
+    decoder.gate.clear()
+    scheduler = GenerationScheduler(decoder=decoder, max_active=2, max_queue=2)
+
+    first = scheduler.submit("ab", [])
+    decoder.starting.wait(timeout=5)
+    second = scheduler.submit("cd", [])
+    decoder.gate.set()
+
+    for stream, query in ((first, "ab"), (second, "cd")):
+        assert next(stream)[0] == query[-1]
+        with pytest.raises(RuntimeError):
+            next(stream)
+
+
+class TinyModel:
+    """与 model.stream_chat 接口相同的小模型：把问题倒序逐字输出，并记录每步推进的是哪个请求"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.trace = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def stream_chat(self, query, history):
+        response = ""
+        for ch in reversed(query):
+            self.gate.wait()
+            time.sleep(self.delay)
+            self.trace.append(query)
+            response += ch
+            yield response, history + [(query, response)]
+
+
+def test_single_request_streams_every_step():
+    model = TinyModel()
+    scheduler = GenerationScheduler(model.stream_chat, max_active=2, max_queue=4)
+
+    outputs = [response for response, _ in scheduler.submit("abc", [])]
+
+    assert outputs == ["c", "cb", "cba"]
+
+
+def test_concurrent_requests_are_interleaved_per_step():
+    model = TinyModel()
+    model.gate.clear()
+    scheduler = GenerationScheduler(model.stream_chat, max_active=4, max_queue=4)
+
+    results = {}
+
+    def run(query):
+        results[query] = [response for response, _ in scheduler.submit(query, [])][-1]
+
+    threads = [threading.Thread(target=run, args=(q,)) for q in ("aaaa", "bbbb", "cccc")]
+    for t in threads:
+        t.start()
+    # 等三个请求都进入队列后再放行模型，保证它们同时处于活跃状态
+    while scheduler.stats()["pending"] + len(scheduler.active) < 3:
+        time.sleep(0.01)
+    model.gate.set()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert results == {"aaaa": "aaaa", "bbbb": "bbbb", "cccc": "cccc"}
+    # 每个解码步依次推进所有活跃序列，而不是一个请求跑完再跑下一个
+    last_step = {q: max(i for i, t in enumerate(model.trace) if t == q) for q in results}
+    first_step = {q: model.trace.index(q) for q in results}
+    assert max(first_step.values()) < min(last_step.values())
+
+
+def test_max_active_limits_interleaved_sequences():
+    model = TinyModel(delay=0.01)
+    scheduler = GenerationScheduler(model.stream_chat, max_active=2, max_queue=8)
+    peak = []
+
+    original_step = scheduler.step
+
+    def step(sequences):
+        peak.append(len(sequences))
+        original_step(sequences)
+
+    scheduler.step = step
+    streams = [scheduler.submit(q, []) for q in ("xxx", "yyy", "zzz", "www")]
+    finals = [list(s)[-1][0] for s in streams]
+
+    assert finals == ["xxx", "yyy", "zzz", "www"]
+    assert max(peak) == 2
+
+
+def test_full_queue_raises():
+    model = TinyModel()
+    model.gate.clear()
+    scheduler = GenerationScheduler(model.stream_chat, max_active=1, max_queue=1)
+
+    first = scheduler.submit("first", [])
+    while not scheduler.active:
+        time.sleep(0.01)
+    scheduler.submit("second", [])
+
+    assert scheduler.full()
+    with pytest.raises(QueueFull):
+        scheduler.submit("third", [])
+
+    model.gate.set()
+    assert list(first)[-1][0] == "tsrif"
+
+
+def test_errors_are_raised_in_the_request_thread():
+    def broken(query, history):
+        yield "partial", history
+        raise RuntimeError("model failed")
+
+    scheduler = GenerationScheduler(broken, max_active=2, max_queue=2)
+    stream = scheduler.submit("q", [])
+
+    assert next(stream) == ("partial", [])
+    with pytest.raises(RuntimeError):
+        next(stream)
+
+
+def test_abandoned_request_stops_advancing():
+    model = TinyModel(delay=0.01)
+    scheduler = GenerationScheduler(model.stream_chat, max_active=2, max_queue=2)
+
+    stream = scheduler.submit("abcdefghij", [])
+    next(stream)
+    stream.close()
+    # 被放弃的序列不再推进，后续请求正常完成
+    assert list(scheduler.submit("xy", []))[-1][0] == "yx"
+    assert model.trace.count("abcdefghij") < 10
+
+
+def test_closing_before_iterating_cancels_the_request():
+    model = TinyModel()
+    model.gate.clear()
+    scheduler = GenerationScheduler(model.stream_chat, max_active=2, max_queue=2)
+
+    # 模拟增量协议：先发送检索结果帧，客户端在读取任何生成结果之前断开
+    stream = scheduler.submit("abcdefghij", [])
+    while not scheduler.active:
+        time.sleep(0.01)
+    stream.close()
+    model.gate.set()
+
+    assert list(stream) == []
+    assert list(scheduler.submit("xy", []))[-1][0] == "yx"
+    assert model.trace.count("abcdefghij") <= 1
@@ -0,0 +1,110 @@
+"""
+图谱 k 跳扩展（backend/app/utils/graph_store.py 中的 Graph.expand）的测试
+向量化的 CSR BFS 必须与逐个节点、逐条边的朴素 BFS 结果完全一致，并遵守 max_fanout / max_edges 上限
+"""
+import random
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))  # config 模块
+# 只登记 app 包的路径，不执行 app/__init__.py（它会加载 ChatGLM / NER 模型）
+if "app" not in sys.modules:
+    app_package = types.ModuleType("app")
+    app_package.__path__ = [str(ROOT / "backend" / "app")]
+    sys.modules["app"] = app_package
+
+from app.utils.graph_store import Graph  # noqa: E402
+
+
+def make_graph(num_nodes, links):
+    return Graph.from_dict({
+        "nodes": [{"id": str(i), "name": f"n{i}"} for i in range(num_nodes)],
+        "links": [{"source": s, "target": t, "name": "r", "sent": 0} for s, t in links],
+        "sents": [""],
+    })
+
+
+def naive_expand(num_nodes, links, seeds, depth, max_fanout=None, max_edges=None):
+    '''按文档语义逐跳扩展：每跳按节点 id 升序、每个节点按边 id 升序取未访问的边，同一跳内的边按 id 升序'''
+    adjacency = [[] for _ in range(num_nodes)]
+    for edge, (source, target) in enumerate(links):
+        adjacency[source].append(edge)
+        if source != target:
+            adjacency[target].append(edge)
+
+    node_seen = set(seeds)
+    edge_seen = set()
+    frontier = sorted(node_seen)
+    result = []
+    for hop in range(depth):
+        if not frontier or (max_edges and len(result) >= max_edges):
+            break
+        fanout = max_fanout
+        if isinstance(max_fanout, list):
+            fanout = max_fanout[min(hop, len(max_fanout) - 1)]
+
+        hop_edges = set()
+        for node in frontier:
+            fresh = [edge for edge in adjacency[node] if edge not in edge_seen]
+            hop_edges.update(fresh[:fanout] if fanout else fresh)
+        hop_edges = sorted(hop_edges)
+        if max_edges:
+            hop_edges = hop_edges[:max_edges - len(result)]
+
+        edge_seen.update(hop_edges)
+        result.extend(hop_edges)
+        reached = {node for edge in hop_edges for node in links[edge]}
+        frontier = sorted(reached - node_seen)
+        node_seen.update(frontier)
+    return result
+
+
+def random_links(rng, num_nodes, num_links):
+    # 含自环和重边
+    return [(rng.randrange(num_nodes), rng.randrange(num_nodes)) for _ in range(num_links)]
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("max_fanout, max_edges", [
+    (None, None), (1, None), (2, None), ([3, 1], None), (None, 5), (2, 7), ([2, 0], 12),
+])
+def test_expand_equals_naive_bfs(seed, max_fanout, max_edges):
+    rng = random.Random(seed)
+    num_nodes = rng.randint(1, 30)
+    links = random_links(rng, num_nodes, rng.randint(0, 60))
+    graph = make_graph(num_nodes, links)
+    seeds = rng.sample(range(num_nodes), rng.randint(1, min(3, num_nodes)))
+
+    for depth in (1, 2, 3):
+        expected = naive_expand(num_nodes, links, seeds, depth, max_fanout, max_edges)
+        assert graph.expand(seeds, depth=depth, max_fanout=max_fanout, max_edges=max_edges) == expected
+
+
+def test_fanout_caps_edges_per_node_per_hop():
+    # 星形图：中心 0 连着 1..9，每个叶子再连两个新节点
+    links = [(0, i) for i in range(1, 10)]
+    links += [(i, 10 + 2 * i) for i in range(1, 10)] + [(i, 11 + 2 * i) for i in range(1, 10)]
+    graph = make_graph(30, links)
+
+    assert graph.expand([0], depth=1, max_fanout=3) == [0, 1, 2]
+    # 第二跳每个叶子只取 1 条新边（通向中心的边已访问过）
+    edges = graph.expand([0], depth=2, max_fanout=[3, 1])
+    assert edges == [0, 1, 2, 9, 10, 11]
+    # 列表不够长时沿用最后一个值
+    assert graph.expand([0], depth=2, max_fanout=[3, 1]) == graph.expand([0], depth=2, max_fanout=[3, 1, 1])
+
+
+def test_max_edges_caps_total_and_stops_expanding():
+    links = [(0, i) for i in range(1, 10)] + [(i, i + 10) for i in range(1, 10)]
+    graph = make_graph(20, links)
+
+    edges = graph.expand([0], depth=3, max_edges=4)
+    assert edges == [0, 1, 2, 3]
+    # 截断后只从保留下来的边到达的节点继续扩展
+    edges = graph.expand([0], depth=2, max_edges=12)
+    assert edges == list(range(9)) + [9, 10, 11]
+    assert len(graph.expand([0], depth=2, max_fanout=2, max_edges=3)) == 3
@@ -0,0 +1,48 @@
+"""
+节点名称索引（backend/app/utils/name_index.py）的测试
+NameIndex.match 的结果必须与逐个节点判断 `name in query or query in name` 完全一致
+"""
+import random
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# 只登记 app 包的路径，不执行 app/__init__.py（它会加载 ChatGLM / NER 模型）
+if "app" not in sys.modules:
+    app_package = types.ModuleType("app")
+    app_package.__path__ = [str(ROOT / "backend" / "app")]
+    sys.modules["app"] = app_package
+
+from app.utils.name_index import NameIndex  # noqa: E402
+
+ALPHABET = "舰艇损管潜水员火灾"
+
+
+def brute_force(names, query):
+    return [idx for idx, name in enumerate(names) if name in query or query in name]
+
+
+def random_text(rng, max_length):
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, max_length)))
+
+
+NAMES = ["舰艇", "舰艇损管", "损管", "潜水员", "潜水", "水", "", "火灾", "灭火剂", "员"]
+
+
+@pytest.mark.parametrize("query", ["", "水", "员", "舰", "舰艇损管条例", "潜水员需要注意什么", "损", "管潜", "无关问题"])
+def test_match_equals_edge_scan(query):
+    assert NameIndex(NAMES).match(query) == brute_force(NAMES, query)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_match_equals_edge_scan_on_random_names(seed):
+    rng = random.Random(seed)
+    names = [random_text(rng, 5) for _ in range(200)]
+    index = NameIndex(names)
+
+    for _ in range(300):
+        query = random_text(rng, 8)
+        assert index.match(query) == brute_force(names, query), query
@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import sqlite3
+from pathlib import Path
+
+from opencc import OpenCC
+
+# 简繁统一为简体，须与 backend/app/utils/wiki_store.py 中的 normalize_title 保持一致
+cc = OpenCC('t2s')
+
+# 重定向链最多跟随的层数，超过的链（包括成环的链）直接丢弃
+MAX_REDIRECT_DEPTH = 8
+
+
+def normalize_title(title: str) -> str:
+    """标题索引键：繁体转简体、去掉空白和下划线、统一小写。"""
+    return "".join(cc.convert(title).replace("_", " ").split()).lower()
+
+
+def _iter_dump_files(paths):
+    """支持直接传入 jsonl 文件，或 WikiExtractor --json 输出的目录（递归读取其中所有文件）。"""
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from sorted(p for p in path.rglob("*") if p.is_file())
+        else:
+            yield path
+
+
+def _summary_of(item: dict) -> str:
+    """优先使用 summary 字段，否则取正文第一段。"""
+    summary = item.get("summary")
+    if summary:
+        return summary.strip()
+    text = item.get("text", "").strip()
+    return text.split("\n\n")[0].strip()
+
+
+def iter_dump(paths):
+    """逐行读取 dump，每行一个 JSON 对象：
+
+    - 词条：{"title": ..., "summary"/"text": ..., "redirects": [...]}
+    - 重定向：{"title": ..., "redirect": 目标标题}
+    """
+    for file in _iter_dump_files(paths):
+        with open(file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def build_wiki_store(dump_paths, db_path: Path) -> dict:
+    """由 dump 构建离线 Wikipedia 摘要库
+
+    pages 保存词条标题和摘要；titles / redirects 以规范化后的标题为主键索引到词条，
+    重定向（包括多层重定向链）在构建时就解析到最终词条，查询时一次索引查找即可。
+    先写临时文件，完成后再原子替换，构建过程中 backend 仍可读取旧库。
+    """
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = db_path.with_name(db_path.name + ".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    conn = sqlite3.connect(str(tmp_path))
+    conn.executescript("""
+        CREATE TABLE pages (id INTEGER PRIMARY KEY, title TEXT NOT NULL, summary TEXT NOT NULL);
+        CREATE TABLE titles (key TEXT PRIMARY KEY, page_id INTEGER NOT NULL) WITHOUT ROWID;
+        CREATE TABLE redirects (key TEXT PRIMARY KEY, page_id INTEGER NOT NULL) WITHOUT ROWID;
+        CREATE TEMP TABLE raw_redirects (key TEXT, target TEXT);
+    """)
+
+    num_pages = 0
+    for item in iter_dump(dump_paths):
+        title = item.get("title", "").strip()
+        if not title:
+            continue
+
+        if item.get("redirect"):
+            conn.execute("INSERT INTO raw_redirects VALUES (?, ?)",
+                         (normalize_title(title), normalize_title(item["redirect"])))
+            continue
+
+        summary = _summary_of(item)
+        if not summary:
+            continue
+        # 简繁两种写法的同名词条只保留先出现的一个
+        key = normalize_title(title)
+        if conn.execute("SELECT 1 FROM titles WHERE key = ?", (key,)).fetchone():
+            continue
+
+        page_id = conn.execute("INSERT INTO pages (title, summary) VALUES (?, ?)", (title, summary)).lastrowid
+        conn.execute("INSERT INTO titles VALUES (?, ?)", (key, page_id))
+        conn.executemany("INSERT INTO raw_redirects VALUES (?, ?)",
+                         [(normalize_title(r), key) for r in item.get("redirects", [])])
+        num_pages += 1
+
+    # 沿重定向链（A → B → 词条）找到最终词条，最多跟随 MAX_REDIRECT_DEPTH 层，成环的链找不到词条会被丢弃；
+    # 只保留目标存在、且不与词条标题冲突的重定向，同一个键有多条链时取最短的一条
+    conn.execute("CREATE INDEX temp.raw_redirects_key ON raw_redirects (key)")
+    conn.execute("""
+        WITH RECURSIVE chain (key, target, depth) AS (
+            SELECT key, target, 1 FROM raw_redirects
+            UNION ALL
+            SELECT c.key, r.target, c.depth + 1 FROM chain c JOIN raw_redirects r ON r.key = c.target
+            WHERE c.depth < ? AND c.target NOT IN (SELECT key FROM titles)
+        )
+        INSERT OR IGNORE INTO redirects (key, page_id)
+        SELECT c.key, t.page_id FROM chain c JOIN titles t ON t.key = c.target
+        WHERE c.key NOT IN (SELECT key FROM titles)
+        ORDER BY c.depth
+    """, (MAX_REDIRECT_DEPTH,))
+    num_redirects = conn.execute("SELECT COUNT(*) FROM redirects").fetchone()[0]
+    conn.commit()
+    conn.execute("DROP TABLE raw_redirects")
+    conn.execute("VACUUM")
+    conn.close()
+
+    os.replace(tmp_path, db_path)
+    return {"pages": num_pages, "redirects": num_redirects}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="由 Wikipedia dump（jsonl / WikiExtractor --json 输出）构建离线摘要库")
+    parser.add_argument("dump", nargs="+", help="dump 文件或目录")
+    parser.add_argument("--out", default="backend/data/wiki.sqlite", help="输出的 SQLite 文件")
+    args = parser.parse_args()
+
+    stats = build_wiki_store(args.dump, Path(args.out))
+    print(f"Saved {stats['pages']} pages and {stats['redirects']} redirects to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,27 @@
+import argparse
+import hashlib
 import json
+import os
 import re
+import sys
 from pathlib import Path
 
+import numpy as np
+
+# 添加项目根目录到路径，以便导入 config 模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import settings
+
+
+# 统计信息 sidecar 中的字段，backend 通过 np.load(mmap_mode="r") 读取
+NODE_STATS_DTYPE = np.dtype([
+    ("in_degree", np.int32),
+    ("out_degree", np.int32),
+    ("pagerank", np.float64),
+    ("component", np.int32),
+])
+
 
 def _extract_version(name: str, prefix: str) -> int:
     """从目录名中提取版本号，匹配 prefix 后的整数，不存在则返回 -1。"""
@@ -42,82 +62,302 @@ def find_latest_kg_path() -> Path:
     return kg_path
 
 
-def convert_kg(kg_path: Path, out_path: Path) -> None:
-    """将 knowledge_graph.json (jsonl) 转为 server 侧使用的 data.json 结构。"""
+def binary_path_for(out_path: Path) -> Path:
+    """data.json 对应的二进制图谱目录：data.graph/"""
+    return out_path.parent / f"{out_path.stem}.graph"
+
+
+def stats_path_for(out_path: Path) -> Path:
+    """data.json 对应的统计信息目录：data.stats/"""
+    return out_path.parent / f"{out_path.stem}.stats"
+
+
+def graph_fingerprint(path: Path) -> dict:
+    """data.json 的内容指纹（字节数 + sha1），须与 backend/app/utils/graph_store.py 中的 graph_fingerprint 保持一致。
+
+    sidecar 记录生成时 data.json 的指纹，backend 据此判断 sidecar 是否对应当前的 data.json，不依赖 mtime。
+    """
+    digest = hashlib.sha1()
+    size = 0
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return {"size": size, "sha1": digest.hexdigest()}
+
+
+def _save_json(path: Path, obj: dict) -> None:
+    """先写临时文件再 os.replace 替换，backend 不会读到写了一半的文件。"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(obj, f)
+    os.replace(tmp_path, path)
+
+
+def pagerank(num_nodes: int, sources: np.ndarray, targets: np.ndarray,
+             damping: float = 0.85, tol: float = 1e-10, max_iter: int = 100) -> np.ndarray:
+    """有向图 PageRank，幂迭代，每轮的稀疏矩阵乘法用 np.bincount 完成；出度为 0 的节点把得分均分给所有节点。"""
+    if num_nodes == 0:
+        return np.zeros(0, dtype=np.float64)
+
+    out_degree = np.bincount(sources, minlength=num_nodes).astype(np.float64)
+    dangling = out_degree == 0
+    inv_out = np.divide(1.0, out_degree, out=np.zeros_like(out_degree), where=~dangling)
+
+    rank = np.full(num_nodes, 1.0 / num_nodes)
+    for _ in range(max_iter):
+        spread = np.bincount(targets, weights=rank[sources] * inv_out[sources], minlength=num_nodes)
+        new_rank = (1.0 - damping) / num_nodes + damping * (spread + rank[dangling].sum() / num_nodes)
+        if np.abs(new_rank - rank).sum() < tol:
+            rank = new_rank
+            break
+        rank = new_rank
+    return rank
+
+
+def connected_components(num_nodes: int, sources: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """弱连通分量：沿边传播最小标签并做指针跳跃，直到收敛；返回从 0 开始连续编号的分量 id。"""
+    labels = np.arange(num_nodes)
+    while True:
+        prev = labels.copy()
+        low = np.minimum(labels[sources], labels[targets])
+        np.minimum.at(labels, sources, low)
+        np.minimum.at(labels, targets, low)
+        labels = labels[labels]
+        if np.array_equal(labels, prev):
+            break
+    return np.unique(labels, return_inverse=True)[1].astype(np.int32)
+
+
+def compute_graph_stats(num_nodes: int, sources: np.ndarray, targets: np.ndarray,
+                        label_ids: np.ndarray, labels: list):
+    """计算节点统计（出入度、PageRank、连通分量）和每种关系的数量。"""
+    node_stats = np.zeros(num_nodes, dtype=NODE_STATS_DTYPE)
+    node_stats["in_degree"] = np.bincount(targets, minlength=num_nodes)
+    node_stats["out_degree"] = np.bincount(sources, minlength=num_nodes)
+    node_stats["pagerank"] = pagerank(num_nodes, sources, targets)
+    node_stats["component"] = connected_components(num_nodes, sources, targets)
+
+    width = max((len(label) for label in labels), default=1)
+    label_stats = np.zeros(len(labels), dtype=[("label", f"U{width}"), ("count", np.int64)])
+    label_stats["label"] = labels
+    label_stats["count"] = np.bincount(label_ids, minlength=len(labels))
+
+    return node_stats, label_stats
+
+
+def _save_array(path: Path, array: np.ndarray) -> None:
+    """先写临时文件再 os.replace 替换：backend 正在内存映射的旧文件保留原 inode，不会被原地截断改写。"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def save_graph_stats(graph: dict, stats_dir: Path, source: dict) -> None:
+    """为 server 侧的图谱生成统计信息 sidecar（nodes.npy / labels.npy）。
+
+    meta.json 记录对应 data.json 的指纹 source（见 graph_fingerprint），最后写入；
+    backend 只使用指纹与当前 data.json 一致的 sidecar。
+    """
+    links = graph["links"]
+    sources = np.fromiter((link["source"] for link in links), dtype=np.int64, count=len(links))
+    targets = np.fromiter((link["target"] for link in links), dtype=np.int64, count=len(links))
+
+    labels = []
+    label_index = {}
+    label_ids = np.empty(len(links), dtype=np.int64)
+    for i, link in enumerate(links):
+        name = link["name"]
+        if name not in label_index:
+            label_index[name] = len(labels)
+            labels.append(name)
+        label_ids[i] = label_index[name]
+
+    node_stats, label_stats = compute_graph_stats(len(graph["nodes"]), sources, targets, label_ids, labels)
+
+    stats_dir.mkdir(parents=True, exist_ok=True)
+    _save_array(stats_dir / "nodes.npy", node_stats)
+    _save_array(stats_dir / "labels.npy", label_stats)
+    _save_json(stats_dir / "meta.json", {"source": source})
+
+    num_components = int(node_stats["component"].max()) + 1 if len(node_stats) else 0
+    print(f"Saved graph stats to {stats_dir} (components={num_components}, labels={len(labels)})")
+
+
+def _save_strings(out_dir: Path, name: str, strings: list) -> None:
+    """字符串表：所有字符串 UTF-8 编码后首尾相接存为 {name}.npy，第 i 个字符串的字节区间为 offsets[i]:offsets[i+1]。"""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    _save_array(out_dir / f"{name}.npy", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    _save_array(out_dir / f"{name}_offsets.npy", offsets)
+
+
+def save_graph_binary(graph: dict, out_dir: Path, source: dict) -> None:
+    """把 server 侧图谱另存为可内存映射的列式二进制格式（data.graph/）。
+
+    目录内容（全部为 .npy）：
+        link_source / link_target / link_label / link_sent   每条边一行（int32）
+        node_value / node_category / node_symbol_size / node_draggable   每个节点一行
+        node_lines_offsets / node_lines   节点出现的句子（CSR）
+        names / labels / sents (+ *_offsets)   字符串表
+        meta.json   数量、格式版本和对应 data.json 的指纹 source（见 graph_fingerprint），最后写入；
+                    backend 只在指纹与当前 data.json 一致时使用二进制格式，复制文件时 mtime 是否保留不影响判断
+
+    每个文件都先写临时文件再 os.replace，backend 正在内存映射的旧文件不会被改写。
+    """
+    nodes, links, sents = graph["nodes"], graph["links"], graph["sents"]
+
+    labels = []
+    label_index = {}
+    link_label = np.empty(len(links), dtype=np.int32)
+    for i, link in enumerate(links):
+        name = link["name"]
+        if name not in label_index:
+            label_index[name] = len(labels)
+            labels.append(name)
+        link_label[i] = label_index[name]
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for key in ("source", "target", "sent"):
+        _save_array(out_dir / f"link_{key}.npy",
+                np.fromiter((link[key] for link in links), dtype=np.int32, count=len(links)))
+    _save_array(out_dir / "link_label.npy", link_label)
+
+    _save_array(out_dir / "node_value.npy", np.fromiter((n["value"] for n in nodes), dtype=np.int32, count=len(nodes)))
+    _save_array(out_dir / "node_category.npy", np.fromiter((n["category"] for n in nodes), dtype=np.int32, count=len(nodes)))
+    _save_array(out_dir / "node_symbol_size.npy", np.fromiter((n["symbolSize"] for n in nodes), dtype=np.int32, count=len(nodes)))
+    _save_array(out_dir / "node_draggable.npy", np.fromiter((n["draggable"] for n in nodes), dtype=bool, count=len(nodes)))
+
+    lines_offsets = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum([len(n["lines"]) for n in nodes], out=lines_offsets[1:])
+    _save_array(out_dir / "node_lines_offsets.npy", lines_offsets)
+    _save_array(out_dir / "node_lines.npy", np.fromiter((i for n in nodes for i in n["lines"]), dtype=np.int32,
+                                                    count=int(lines_offsets[-1])))
+
+    _save_strings(out_dir, "names", [n["name"] for n in nodes])
+    _save_strings(out_dir, "labels", labels)
+    _save_strings(out_dir, "sents", sents)
+
+    # meta.json 最后写入（同样先写临时文件再替换），backend 只有看到新的 meta.json 才会切换到新文件
+    _save_json(out_dir / "meta.json", {
+        "format": 1,
+        "nodes": len(nodes),
+        "links": len(links),
+        "sents": len(sents),
+        "source": source,
+    })
+
+    print(f"Saved binary graph to {out_dir}")
+
+
+def read_kg_items(kg_path: Path) -> list:
+    """读取 knowledge_graph.json (jsonl)。"""
     items = []
     with kg_path.open("r", encoding="utf-8") as f:
         for line in f:
             line = line.strip()
             if line:
                 items.append(json.loads(line))
+    return items
 
-    nodes = []
-    node_index = {}  # name -> idx
-    links = []
-    sents = []
 
+def _iter_sentences(items: list):
+    """依次产出 (句子, 有效三元组列表)，跳过空句子和缺少实体 / 关系的三元组。"""
     for item in items:
         sent = item.get("sentText", "").strip()
         if not sent:
             continue
 
-        sent_idx = len(sents)
-        sents.append(sent)
-
+        mentions = []
         for rel in item.get("relationMentions", []):
             h = rel.get("em1Text", "").strip()
             t = rel.get("em2Text", "").strip()
             r = rel.get("label", "").strip()
-            if not h or not t or not r:
-                continue
+            if h and t and r:
+                mentions.append((h, t, r))
+        yield sent, mentions
+
 
+def _new_node(idx: int, name: str, sent_idx: int) -> dict:
+    return {
+        "id": str(idx),
+        "name": name,
+        "category": 0,
+        "draggable": True,
+        "value": 1,
+        "lines": [sent_idx],
+        "symbolSize": 20
+    }
+
+
+def build_server_graph(items: list) -> dict:
+    """构建 server 侧使用的 data.json 结构。"""
+    nodes = []
+    node_index = {}  # name -> idx
+    links = []
+    sents = []
+
+    for sent, mentions in _iter_sentences(items):
+        sent_idx = len(sents)
+        sents.append(sent)
+
+        for h, t, r in mentions:
             # 建节点
             for name in (h, t):
                 if name not in node_index:
                     idx = len(nodes)
                     node_index[name] = idx
-                    nodes.append({
-                        "id": str(idx),
-                        "name": name,
-                        "category": 0,
-                        "draggable": True,
-                        "value": 1,
-                        "lines": [sent_idx],
-                        "symbolSize": 20
-                    })
+                    nodes.append(_new_node(idx, name, sent_idx))
                 else:
                     idx = node_index[name]
-                    if sent_idx not in nodes[idx]["lines"]:
+                    # 句子按顺序处理，lines 始终升序，只需和最后一个比较
+                    if nodes[idx]["lines"][-1] != sent_idx:
                         nodes[idx]["lines"].append(sent_idx)
                     nodes[idx]["value"] += 1
 
-            source_idx = node_index[h]
-            target_idx = node_index[t]
             links.append({
-                "source": source_idx,
-                "target": target_idx,
+                "source": node_index[h],
+                "target": node_index[t],
                 "name": r,
                 "sent": sent_idx
             })
 
+    return {
+        "nodes": nodes,
+        "links": links,
+        "sents": sents
+    }
+
+
+def convert_kg(kg_path: Path, out_path: Path) -> None:
+    """将 knowledge_graph.json (jsonl) 转为 server 侧使用的 data.json 结构。"""
+    graph = build_server_graph(read_kg_items(kg_path))
+
+    nodes, links, sents = graph["nodes"], graph["links"], graph["sents"]
     out_path.parent.mkdir(parents=True, exist_ok=True)
     with out_path.open("w", encoding="utf-8") as f:
-        json.dump({
-            "nodes": nodes,
-            "links": links,
-            "sents": sents
-        }, f, ensure_ascii=False, indent=2)
+        json.dump(graph, f, ensure_ascii=False, indent=2)
 
     print(f"Saved graph data to {out_path} (nodes={len(nodes)}, links={len(links)}, sents={len(sents)})")
 
+    source = graph_fingerprint(out_path)
+    save_graph_stats(graph, stats_path_for(out_path), source)
+    save_graph_binary(graph, binary_path_for(out_path), source)
+
 
 def main():
+    parser = argparse.ArgumentParser(description="将最新的 knowledge_graph.json 转为 server 侧的 data.json")
+    parser.add_argument("--out", default=str(settings.GRAPH_DATA_PATH),
+                        help="输出的 data.json（默认为 backend 读取的 GRAPH_DATA_PATH）")
+    args = parser.parse_args()
+
     kg_path = find_latest_kg_path()
-    out_path = Path("server/data/data.json")
+    out_path = Path(args.out)
     print(f"Using KG file: {kg_path}")
     convert_kg(kg_path, out_path)
 
 
 if __name__ == "__main__":
     main()
-